@@ -0,0 +1,154 @@
+import asyncio
+import json
+import pathlib
+import typing as T
+import click
+
+from data_collector import load_query
+from lib.batch import BatchJob, BatchOptions, PreparedJob, run_batch
+from lib.cache import ResultCache
+from lib.common import Repository
+from lib.defaults import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_ENDPOINT_CONCURRENCY,
+    DEFAULT_POST_THRESHOLD,
+    DEFAULT_RETRIES,
+    PARQUET_CODECS,
+)
+from lib.sinks import (
+    SinkOptions,
+    sink_suffix,
+    sink_types,
+    validate_sink_columns,
+    validate_sink_options,
+)
+from lib.transport import RetryPolicy
+
+
+def prepare_jobs(
+    manifest_path: pathlib.Path, sink_options: SinkOptions
+) -> T.List[PreparedJob]:
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        jobs = BatchJob.schema().load(json.load(manifest_file), many=True)
+    base = manifest_path.parent
+    prepared = []
+    for job in jobs:
+        repository = job.repository.lower()
+        if repository not in ["uniprot", "rhea"]:
+            raise click.BadParameter(f"Unknown repository {job.repository}")
+        output = base / job.output
+        if sink_suffix(output) not in sink_types:
+            raise click.BadParameter(f"Unsupported output file {job.output}")
+        try:
+            validate_sink_options(output, sink_options)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--compression")
+        query, url = load_query(base / job.config, repository)
+        try:
+            validate_sink_columns(output, [v.name for v in query.variables])
+        except ValueError as error:
+            raise click.BadParameter(f"{error}, {job.output} can not be saved")
+        prepared.append(PreparedJob(Repository[repository.upper()], query, url, output))
+    return prepared
+
+
+async def report(jobs: T.Sequence[PreparedJob], options: BatchOptions) -> int:
+    failures = 0
+    async for job, error in run_batch(jobs, options):
+        if error is None:
+            click.echo(f"Saved {job.output}")
+        else:
+            failures += 1
+            click.echo(f"Failed {job.output}: {error}", err=True)
+    return failures
+
+
+@click.command(help="Run all jobs listed in the manifest saved in manifest_path")
+@click.argument(
+    "manifest_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    "--uniprot-concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_ENDPOINT_CONCURRENCY,
+    show_default=True,
+    help="Maximal number of queries running against UniProt at the same time",
+)
+@click.option(
+    "--rhea-concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_ENDPOINT_CONCURRENCY,
+    show_default=True,
+    help="Maximal number of queries running against Rhea at the same time",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Number of result rows parsed and written at once",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(PARQUET_CODECS, case_sensitive=False),
+    default=None,
+    help="Compression codec of parquet (default snappy) and feather/arrow (default lz4) outputs",
+)
+@click.option(
+    "--row-group-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Maximal number of rows in a parquet row group or an arrow record batch",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=1),
+    default=DEFAULT_RETRIES,
+    show_default=True,
+    help="Number of attempts for a request failing with 429 or 5xx status",
+)
+@click.option(
+    "--post-threshold",
+    type=click.IntRange(min=0),
+    default=DEFAULT_POST_THRESHOLD,
+    show_default=True,
+    help="Send queries longer than this many encoded characters using POST",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    show_default=True,
+    help="Reuse results of identical queries stored in the result cache",
+)
+def run_batch_command(
+    manifest_path: pathlib.Path,
+    uniprot_concurrency: int,
+    rhea_concurrency: int,
+    chunk_size: int,
+    compression: T.Optional[str],
+    row_group_size: T.Optional[int],
+    retries: int,
+    post_threshold: int,
+    cache: bool,
+) -> None:
+    sink_options = SinkOptions(compression, row_group_size)
+    jobs = prepare_jobs(manifest_path, sink_options)
+    options = BatchOptions(
+        concurrency={
+            Repository.UNIPROT: uniprot_concurrency,
+            Repository.RHEA: rhea_concurrency,
+        },
+        chunk_size=chunk_size,
+        post_threshold=post_threshold,
+        retry=RetryPolicy(attempts=retries),
+        cache=ResultCache() if cache else None,
+        sink=sink_options,
+    )
+    failures = asyncio.run(report(jobs, options))
+    if failures:
+        raise click.ClickException(f"{failures} of {len(jobs)} jobs failed")
+
+
+if __name__ == "__main__":
+    run_batch_command()
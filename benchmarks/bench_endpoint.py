@@ -0,0 +1,223 @@
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as T
+import click
+
+from benchmarks.stub_endpoint import StubSettings, serve
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BATCH_VALUES = 100
+LATENCY_SLACK = 0.01
+
+CONFIGS: T.Dict[str, T.Dict[str, T.Any]] = {
+    "proteins": {
+        "dataSelector": {"columns": ["ProteinId", "Protein", "Reaction"]},
+        "dataFilter": {"reviewed": True},
+    },
+    "pfams": {
+        "dataSelector": {"columns": ["ProteinId", "Protein", "Reaction"]},
+        "dataFilter": {"pfams": [f"PF{i:05d}" for i in range(BATCH_VALUES)]},
+    },
+    "federated": {
+        "dataSelector": {"columns": ["ProteinId", "Reaction", "Chebi", "Smiles"]},
+        "dataFilter": {"reviewed": True},
+    },
+}
+
+# Scenario name, config, output suffix and options of the run command.
+SCENARIOS: T.List[T.Tuple[str, str, str, T.List[str]]] = [
+    ("single", "proteins", ".csv", []),
+    ("parquet", "proteins", ".parquet", []),
+    ("gzip", "proteins", ".csv.gz", []),
+    ("zstd", "proteins", ".csv.zst", []),
+    ("paged", "proteins", ".csv", ["--page-size", "{page_size}"]),
+    ("batched", "pfams", ".csv", ["--batch-size", "10"]),
+    ("estimated", "proteins", ".csv", ["--estimate"]),
+    ("cached", "proteins", ".csv", ["--cache", "--cache-dir", "{cache_dir}"]),
+    ("client_join", "federated", ".csv", ["--join-strategy", "client"]),
+]
+METRICS = ["rows_per_second", "peak_rss", "latency"]
+
+
+def count_rows(path: pathlib.Path) -> int:
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    if path.suffix in [".gz", ".zst"]:
+        from lib.sinks import read_data
+
+        return sum(len(chunk) for chunk in read_data(path))
+    with open(path, "rb") as output:
+        return sum(1 for _ in output) - 1
+
+
+def run_once(
+    arguments: T.List[str], out_path: pathlib.Path, profile_path: pathlib.Path
+) -> T.Dict[str, T.Optional[float]]:
+    out_path.unlink(missing_ok=True)
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(
+            [sys.executable, "data_collector.py", *arguments],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=errors,
+        )
+        # wait4 reports the resource usage of this child alone.
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        seconds = time.perf_counter() - start
+        if process.returncode:
+            errors.seek(0)
+            raise click.ClickException(errors.read().decode("utf-8", "replace"))
+    with open(profile_path, encoding="utf-8") as profile_file:
+        stages = {s["name"]: s for s in json.load(profile_file)["stages"]}
+    requests = stages.get("time_to_first_byte")
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "rows_per_second": count_rows(out_path) / seconds,
+        "peak_rss": usage.ru_maxrss * scale,
+        "latency": requests["seconds"] / requests["count"] if requests else None,
+    }
+
+
+def median(values: T.List[T.Optional[float]]) -> T.Optional[float]:
+    known = [v for v in values if v is not None]
+    return statistics.median(known) if known else None
+
+
+def find_regressions(
+    results: T.Dict[str, T.Dict[str, T.Optional[float]]],
+    baseline: T.Dict[str, T.Dict[str, T.Optional[float]]],
+    tolerance: float,
+) -> T.List[str]:
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name, {})
+        rate, old_rate = metrics["rows_per_second"], previous.get("rows_per_second")
+        if rate is not None and old_rate and rate < old_rate * (1 - tolerance):
+            regressions.append(f"{name}: {rate:,.0f} rows/s, was {old_rate:,.0f}")
+        rss, old_rss = metrics["peak_rss"], previous.get("peak_rss")
+        if rss is not None and old_rss and rss > old_rss * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak RSS {rss / 2**20:.0f} MiB, was {old_rss / 2**20:.0f}"
+            )
+        latency, old_latency = metrics["latency"], previous.get("latency")
+        if (
+            latency is not None
+            and old_latency is not None
+            and latency > old_latency * (1 + tolerance) + LATENCY_SLACK
+        ):
+            regressions.append(
+                f"{name}: latency {latency * 1000:.0f} ms, was {old_latency * 1000:.0f}"
+            )
+    return regressions
+
+
+@click.command(help="Measure the run command end to end against a local stub endpoint")
+@click.option("--rows", type=click.IntRange(min=1), default=200_000, show_default=True)
+@click.option(
+    "--latency", type=click.FloatRange(min=0), default=0.05, show_default=True
+)
+@click.option(
+    "--failure-rate", type=click.FloatRange(0, 1), default=0.0, show_default=True
+)
+@click.option("--repeat", type=click.IntRange(min=1), default=3, show_default=True)
+@click.option(
+    "--scenario",
+    "selected",
+    multiple=True,
+    type=click.Choice([s[0] for s in SCENARIOS]),
+    help="Run only the given scenarios",
+)
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+    default=None,
+    help="Results of a previous run to compare with",
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    default=0.2,
+    show_default=True,
+    help="Relative change of a metric reported as a regression",
+)
+@click.option(
+    "--save",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    default=None,
+    help="Save the results to be used as a baseline",
+)
+def main(
+    rows: int,
+    latency: float,
+    failure_rate: float,
+    repeat: int,
+    selected: T.Tuple[str, ...],
+    baseline: T.Optional[pathlib.Path],
+    tolerance: float,
+    save: T.Optional[pathlib.Path],
+) -> None:
+    settings = StubSettings(rows, latency, failure_rate, values=BATCH_VALUES)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, serve(settings) as url:
+        work = pathlib.Path(directory)
+        for name, config in CONFIGS.items():
+            (work / f"{name}.json").write_text(json.dumps(config), encoding="utf-8")
+        replacements = {"page_size": str(rows // 10), "cache_dir": str(work / "cache")}
+        for name, config, suffix, options in SCENARIOS:
+            if selected and name not in selected:
+                continue
+            out_path = work / f"{name}{suffix}"
+            profile_path = work / f"{name}.profile.json"
+            arguments = [
+                str(work / f"{config}.json"),
+                "uniprot",
+                "--out-path",
+                str(out_path),
+                "--profile",
+                str(profile_path),
+                "--no-progress",
+                "--endpoint",
+                f"uniprot={url}/uniprot",
+                "--endpoint",
+                f"rhea={url}/rhea",
+                *(option.format(**replacements) for option in options),
+            ]
+            if "--cache" in options:
+                run_once(arguments, out_path, profile_path)
+            else:
+                arguments.append("--no-cache")
+            runs = [run_once(arguments, out_path, profile_path) for _ in range(repeat)]
+            results[name] = {m: median([r[m] for r in runs]) for m in METRICS}
+            metrics = results[name]
+            latency_text = (
+                f"{metrics['latency'] * 1000:7.0f} ms"
+                if metrics["latency"] is not None
+                else "      - ms"
+            )
+            click.echo(
+                f"{name:12} {metrics['rows_per_second']:12,.0f} rows/s "
+                f"{metrics['peak_rss'] / 2**20:7.0f} MiB peak RSS {latency_text} latency"
+            )
+    if save:
+        save.write_text(json.dumps(results, indent=4) + "\n", encoding="utf-8")
+    if baseline:
+        previous = json.loads(baseline.read_text(encoding="utf-8"))
+        regressions = find_regressions(results, previous, tolerance)
+        for regression in regressions:
+            click.echo(f"  regression {regression}", err=True)
+        if regressions:
+            raise click.ClickException(f"{len(regressions)} regressions found")
+
+
+if __name__ == "__main__":
+    main()
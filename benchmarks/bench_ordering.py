@@ -0,0 +1,110 @@
+import functools as FT
+import pathlib
+import statistics
+import time
+import typing as T
+import click
+
+import lib.sparql_query as SQ
+import lib.uniprot.config as UC
+from data_collector import get_query, load_config, redirect_endpoints
+from lib.execution import ExecutionOptions, execute
+from lib.sparql_query import SelectQuery
+from lib.uniprot.query_generator import UniprotQueryBuilder
+
+TAXA_CONFIG = {
+    "dataSelector": {"columns": ["ProteinId", "Name"]},
+    "dataFilter": {"reviewed": True, "taxa": ["9606"]},
+}
+
+
+def measure(
+    query: SelectQuery, url: str, options: ExecutionOptions
+) -> T.Tuple[float, int]:
+    start = time.perf_counter()
+    rows = sum(len(chunk) for chunk in execute(query, url, options))
+    return time.perf_counter() - start, rows
+
+
+def check_taxa_first() -> None:
+    config = UC.UniprotSearchConfig.schema().load(TAXA_CONFIG)
+    query = get_query(config, FT.partial(UniprotQueryBuilder, optimize=True))
+    patterns = [
+        pattern
+        for pattern in query.graph_pattern.patterns
+        if not isinstance(pattern, (SQ.BindExpression, SQ.FilterExpression))
+    ]
+    # Only the reviewed filter, more selective still, goes before the taxa.
+    if not isinstance(patterns[1], SQ.InlineData):
+        raise click.ClickException(
+            "The taxa VALUES block has to follow the reviewed filter\n"
+            + query.get_pretty_text()
+        )
+
+
+@click.command(help="Compare execution times of optimized and unoptimized queries")
+@click.argument(
+    "config_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+)
+@click.argument(
+    "repository", type=click.Choice(["uniprot", "rhea"], case_sensitive=False)
+)
+@click.option(
+    "--endpoint",
+    default=None,
+    help="SPARQL endpoint to query instead of the public one of the repository",
+)
+@click.option(
+    "--local-store",
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+    default=None,
+    help="Run the queries in a local Oxigraph store instead of an endpoint",
+)
+@click.option("--repeat", type=click.IntRange(min=1), default=3, show_default=True)
+@click.option(
+    "--show-queries", is_flag=True, default=False, help="Print both queries first"
+)
+def main(
+    config_path: pathlib.Path,
+    repository: str,
+    endpoint: T.Optional[str],
+    local_store: T.Optional[pathlib.Path],
+    repeat: int,
+    show_queries: bool,
+) -> None:
+    check_taxa_first()
+    repository = repository.lower()
+    config, builder, url = load_config(config_path, repository)
+    endpoints = {repository: endpoint} if endpoint else {}
+    variants = {}
+    for name, optimize in [("unoptimized", False), ("optimized", True)]:
+        query = get_query(config, FT.partial(builder, optimize=optimize))
+        variants[name] = redirect_endpoints(query, url, repository, endpoints)
+        if show_queries:
+            click.echo(f"# {name}\n{variants[name][0].get_pretty_text()}\n")
+    options = ExecutionOptions()
+    if local_store is not None:
+        from lib.local_store import LocalStore
+
+        options.local_store = LocalStore(local_store)
+    times: T.Dict[str, T.List[float]] = {name: [] for name in variants}
+    rows: T.Dict[str, int] = {}
+    # Variants alternate so that both see the same state of the endpoint.
+    for _ in range(repeat):
+        for name, (query, query_url) in variants.items():
+            seconds, rows[name] = measure(query, query_url, options)
+            times[name].append(seconds)
+    for name, seconds in times.items():
+        click.echo(
+            f"{name:12} {statistics.median(seconds):9.3f} s {rows[name]:10} rows"
+        )
+    unoptimized = statistics.median(times["unoptimized"])
+    optimized = statistics.median(times["optimized"])
+    click.echo(f"speedup      {unoptimized / optimized:9.2f}x")
+    if rows["unoptimized"] != rows["optimized"]:
+        raise click.ClickException("Both queries have to return the same rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import itertools as IT
+import time
+import typing as T
+import click
+
+from lib.query_generator import get_query_plan, get_shortest_paths
+import lib.rhea.config as RC
+from lib.rhea.query_generator import RheaQueryBuilder
+import lib.uniprot.config as UC
+from lib.uniprot.query_generator import UniprotQueryBuilder
+
+
+def uniprot_configs(count: int) -> T.Iterator[UC.UniprotSearchConfig]:
+    selections = IT.cycle(
+        [
+            [UC.Feature.PROTEIN_ID, UC.Feature.PROTEIN, UC.Feature.REACTION],
+            [UC.Feature.PROTEIN, UC.Feature.NAME, UC.Feature.SEQUENCE],
+            [UC.Feature.PROTEIN_ID, UC.Feature.SEQUENCE],
+        ]
+    )
+    for index, columns in zip(range(count), selections):
+        yield UC.UniprotSearchConfig(
+            UC.UniprotSelection(columns),
+            UC.UniprotSearchFilter(pfams=[f"PF{index:05d}"], taxa=["2759"]),
+        )
+
+
+def rhea_configs(count: int) -> T.Iterator[RC.RheaSearchConfig]:
+    selections = IT.cycle(
+        [
+            [RC.Feature.REACTION, RC.Feature.SMILES, RC.Feature.REACTION_SIDE],
+            [RC.Feature.REACTION, RC.Feature.CHEBI],
+        ]
+    )
+    for index, columns in zip(range(count), selections):
+        yield RC.RheaSearchConfig(
+            RC.RheaSelection(columns),
+            RC.RheaSearchFilter(reactions=[str(10000 + index)]),
+        )
+
+
+def measure(count: int, cold: bool) -> float:
+    start = time.perf_counter()
+    for config in uniprot_configs(count):
+        if cold:
+            get_query_plan.cache_clear()
+            get_shortest_paths.cache_clear()
+        UniprotQueryBuilder(config).get_query()
+    for config in rhea_configs(count):
+        if cold:
+            get_query_plan.cache_clear()
+            get_shortest_paths.cache_clear()
+        RheaQueryBuilder(config).get_query()
+    return 2 * count / (time.perf_counter() - start)
+
+
+@click.command(help="Measure query planning throughput with and without plan cache")
+@click.option("--count", type=click.IntRange(min=1), default=2000, show_default=True)
+def main(count: int) -> None:
+    cold = measure(count, cold=True)
+    warm = measure(count, cold=False)
+    click.echo(f"uncached planning: {cold:10.0f} queries/s")
+    click.echo(f"cached planning:   {warm:10.0f} queries/s")
+    click.echo(f"speedup:           {warm / cold:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import io
+import time
+import typing as T
+import click
+
+import lib.sparql_query as SQ
+
+
+def large_values_query(count: int) -> SQ.SelectQuery:
+    protein = SQ.Variable("protein")
+    pfam = SQ.Variable("pfam")
+    values = [f"<http://purl.uniprot.org/pfam/PF{i:07d}>" for i in range(count)]
+    return SQ.SelectQuery(
+        [SQ.Prefix("up", "<http://purl.uniprot.org/core/>")],
+        [protein],
+        SQ.SimpleGraphPattern(
+            [
+                SQ.Triplet(protein, "rdfs:seeAlso", pfam),
+                SQ.InlineData(pfam, values),
+            ]
+        ),
+    )
+
+
+def wide_union_query(count: int) -> SQ.SelectQuery:
+    protein = SQ.Variable("protein")
+    return SQ.SelectQuery(
+        [SQ.Prefix("up", "<http://purl.uniprot.org/core/>")],
+        [protein],
+        SQ.SimpleGraphPattern(
+            [
+                SQ.Union(
+                    [
+                        SQ.SimpleGraphPattern(
+                            [SQ.Triplet(protein, "up:organism", f"taxon:{i}")]
+                        )
+                        for i in range(count)
+                    ]
+                )
+            ]
+        ),
+    )
+
+
+def deep_query(depth: int) -> SQ.SelectQuery:
+    protein = SQ.Variable("protein")
+    pattern: SQ.GraphPattern = SQ.SimpleGraphPattern(
+        [SQ.Triplet(protein, "a", "up:Protein")]
+    )
+    for _ in range(depth):
+        pattern = SQ.SimpleGraphPattern([SQ.OptionalGraphPattern(pattern)])
+    return SQ.SelectQuery([], [protein], pattern)
+
+
+def measure(query: SQ.SelectQuery, repeat: int) -> T.Tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        buffer = io.StringIO()
+        start = time.perf_counter()
+        query.write(buffer)
+        best = min(best, time.perf_counter() - start)
+        size = buffer.tell()
+    return best, size
+
+
+@click.command(help="Measure rendering time of large VALUES blocks and wide UNIONs")
+@click.option(
+    "--values", type=click.IntRange(min=1), default=100_000, show_default=True
+)
+@click.option(
+    "--branches", type=click.IntRange(min=1), default=20_000, show_default=True
+)
+@click.option("--depth", type=click.IntRange(min=1), default=5_000, show_default=True)
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True)
+def main(values: int, branches: int, depth: int, repeat: int) -> None:
+    cases = {
+        f"VALUES with {values} values": large_values_query(values),
+        f"UNION with {branches} branches": wide_union_query(branches),
+        f"{depth} nested groups": deep_query(depth),
+    }
+    for name, query in cases.items():
+        seconds, size = measure(query, repeat)
+        click.echo(
+            f"{name:32} {seconds * 1000:9.1f} ms {size / 1024**2:8.2f} MiB "
+            f"{size / 1024**2 / seconds:8.1f} MiB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
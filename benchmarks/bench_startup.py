@@ -0,0 +1,75 @@
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+import time
+import typing as T
+import click
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["pandas", "numpy", "requests", "pyarrow", "aiohttp", "openpyxl"]
+IMPORT_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)")
+
+COMMANDS: T.Dict[str, T.Tuple[T.List[str], T.List[str]]] = {
+    "help": (["--help"], HEAVY_MODULES + ["networkx", "marshmallow"]),
+    "print-query": (
+        ["sample_config_uniprot.json", "uniprot", "--print-query"],
+        HEAVY_MODULES,
+    ),
+}
+
+
+def import_times(arguments: T.List[str]) -> T.Tuple[T.Set[str], int]:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "data_collector.py", *arguments],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = set()
+    total = 0
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules.add(match.group(3))
+            if not match.group(2):
+                total += int(match.group(1))
+    return modules, total
+
+
+def wall_time(arguments: T.List[str], repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "data_collector.py", *arguments],
+            cwd=ROOT,
+            capture_output=True,
+            check=True,
+        )
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+@click.command(help="Measure CLI startup time and check heavy modules stay unloaded")
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True)
+def main(repeat: int) -> None:
+    failed = False
+    for name, (arguments, forbidden) in COMMANDS.items():
+        modules, total = import_times(arguments)
+        loaded = sorted({module.split(".")[0] for module in modules} & set(forbidden))
+        click.echo(
+            f"{name:12} wall {wall_time(arguments, repeat) * 1000:7.1f} ms, "
+            f"imports {total / 1000:7.1f} ms"
+        )
+        if loaded:
+            failed = True
+            click.echo(f"  unexpected imports: {', '.join(loaded)}", err=True)
+    if failed:
+        raise click.ClickException("Startup imports heavy modules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import contextlib
+import http.server
+import random
+import re
+import threading
+import time
+import typing as T
+import urllib.parse
+from dataclasses import dataclass
+import click
+
+BLOCK_ROWS = 10_000
+SELECT = re.compile(r"^SELECT(?: DISTINCT)? (.+)$", re.MULTILINE)
+VARIABLE = re.compile(r"\?(\w+)\)|\?(\w+)")
+VALUES = re.compile(r"VALUES \?\w+ \{\n(.*?)\n\s*\}", re.DOTALL)
+LIMIT = re.compile(r"^\s*LIMIT (\d+)$", re.MULTILINE)
+OFFSET = re.compile(r"^\s*OFFSET (\d+)$", re.MULTILINE)
+
+
+@dataclass
+class StubSettings:
+    rows: int = 100_000
+    latency: float = 0.0
+    failure_rate: float = 0.0
+    # Number of VALUES the full result is spread over, a query with a part of
+    # them returns the matching part of the rows.
+    values: int = 1
+    # Rhea returns one row per reaction, so that joins with it keep the size
+    # of the UniProt result.
+    reactions: int = 1000
+
+
+def synthetic_value(name: str, row: int, settings: StubSettings) -> str:
+    if name == "protein":
+        return f"http://purl.uniprot.org/uniprot/P{row:07d}"
+    if name == "protein_id":
+        return f"P{row:07d}"
+    if name == "reaction":
+        return f"http://rdf.rhea-db.org/{10000 + row % settings.reactions}"
+    if name == "sequence":
+        return "MKVLAAGIVG" * (row % 20 + 1)
+    return f"{name}_{row}"
+
+
+def result_rows(query: str, total: int, settings: StubSettings) -> range:
+    start, stop = 0, total
+    values = VALUES.search(query)
+    if values:
+        # Every value selects its own block of rows, numbered by the digits
+        # in the value.
+        lines = values.group(1).split()
+        per_value = max(total // settings.values, 1)
+        first = int(re.sub(r"\D", "", lines[0]) or 0)
+        start = first * per_value
+        stop = start + per_value * len(lines)
+    offset = OFFSET.search(query)
+    limit = LIMIT.search(query)
+    if offset:
+        start = min(start + int(offset.group(1)), stop)
+    if limit:
+        stop = min(start + int(limit.group(1)), stop)
+    return range(start, stop)
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = StubSettings()
+
+    def log_message(self, *_: T.Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        parameters = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        self.respond(parameters.get("query", [""])[0])
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        parameters = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        self.respond(parameters.get("query", [""])[0])
+
+    def respond(self, query: str) -> None:
+        if self.settings.latency:
+            time.sleep(self.settings.latency)
+        if random.random() < self.settings.failure_rate:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        select = SELECT.search(query)
+        projection = select.group(1) if select else "?x"
+        names = list(dict.fromkeys(a or b for a, b in VARIABLE.findall(projection)))
+        total = self.settings.rows
+        if self.path.startswith("/rhea"):
+            total = self.settings.reactions
+        rows = result_rows(query, total, self.settings)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.write_chunk(",".join(names) + "\n")
+        if "COUNT(" in projection:
+            self.write_chunk(f"{len(rows)}\n")
+        else:
+            for start in range(rows.start, rows.stop, BLOCK_ROWS):
+                block = range(start, min(start + BLOCK_ROWS, rows.stop))
+                self.write_chunk(
+                    "".join(
+                        ",".join(synthetic_value(n, row, self.settings) for n in names)
+                        + "\n"
+                        for row in block
+                    )
+                )
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+@contextlib.contextmanager
+def serve(
+    settings: StubSettings, host: str = "127.0.0.1", port: int = 0
+) -> T.Iterator[str]:
+    handler = type("Handler", (StubHandler,), {"settings": settings})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@click.command(help="Serve synthetic CSV results in place of the SPARQL endpoints")
+@click.option("--port", type=click.IntRange(min=0), default=8000, show_default=True)
+@click.option("--rows", type=click.IntRange(min=0), default=100_000, show_default=True)
+@click.option("--latency", type=click.FloatRange(min=0), default=0.0, show_default=True)
+@click.option(
+    "--failure-rate", type=click.FloatRange(0, 1), default=0.0, show_default=True
+)
+def main(port: int, rows: int, latency: float, failure_rate: float) -> None:
+    settings = StubSettings(rows, latency, failure_rate)
+    with serve(settings, port=port) as url:
+        click.echo(f"Serving {url}/uniprot and {url}/rhea, press Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,34 @@
 from ast import match_case
 import click
 import pathlib
-import requests
-import pandas as pd
-import io
 import typing as T
 from enum import Enum, auto
+import dataclasses
+import functools
 import json
+import sys
 
-import lib.query_generator
-import lib.rhea.config as RC
-from lib.rhea.query_generator import RheaQueryBuilder
+from lib.defaults import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_DISTINCT_STRATEGY,
+    DEFAULT_JOIN_STRATEGY,
+    DEFAULT_MAX_SIZE,
+    DEFAULT_POST_THRESHOLD,
+    DEFAULT_RETRIES,
+    DEFAULT_TTL,
+    DISTINCT_STRATEGIES,
+    JOIN_STRATEGIES,
+    PARQUET_CODECS,
+)
+from lib import profiling
 from lib.sparql_query import SelectQuery
-import lib.uniprot.config as UC
-from lib.uniprot.query_generator import UniprotQueryBuilder
+
+# Pandas, requests, networkx and the rest of the stack are imported in the
+# functions using them so that --help and --print-query start quickly.
+if T.TYPE_CHECKING:
+    import lib.query_generator
 
 
 class Repository(Enum):
@@ -26,20 +41,25 @@ def cb_validate_path(
 ) -> T.Optional[pathlib.Path]:
     if not path:
         return None
-    extension = path.suffix
-    if extension not in [".csv", ".xlsx"]:
-        raise click.BadParameter("Only xlsx and csv output files are supported.")
+    from lib.outputs import OUTPUT_SUFFIXES, sink_suffix
+
+    if sink_suffix(path) not in OUTPUT_SUFFIXES:
+        supported = ", ".join(OUTPUT_SUFFIXES)
+        raise click.BadParameter(f"Only {supported} output files are supported.")
     return path
 
 
-def collect_data(query: SelectQuery, url: str) -> pd.DataFrame:
-    response = requests.get(
-        url, params={"query": query.get_pretty_text(), "format": "csv"}
-    )
-    response.raise_for_status()
-    if response.ok:
-        data_frame = pd.read_csv(io.StringIO(response.text), sep=",", header=0)
-    return data_frame
+def cb_parse_endpoints(
+    ctx: click.Context, command: click.Command, values: T.Sequence[str]
+) -> T.Dict[str, str]:
+    endpoints = {}
+    for value in values:
+        name, separator, url = value.partition("=")
+        if separator and name.lower() in ["uniprot", "rhea"]:
+            endpoints[name.lower()] = url
+        else:
+            endpoints[""] = value
+    return endpoints
 
 
 TConfig = T.TypeVar("TConfig")
@@ -48,19 +68,60 @@ TConfig = T.TypeVar("TConfig")
 def get_query(
     config: TConfig,
     query_builder_ctor: T.Callable[
-        [TConfig], lib.query_generator.SparqlQueryBuilder[TConfig]
+        [TConfig], "lib.query_generator.SparqlQueryBuilder[TConfig]"
     ],
 ) -> SelectQuery:
     builder = query_builder_ctor(config)
-    return builder.get_query()
+    with profiling.span("planning"):
+        return builder.get_query()
+
 
+def load_config(
+    config_path: pathlib.Path, repository: str
+) -> T.Tuple[T.Any, T.Callable[[T.Any], "lib.query_generator.SparqlQueryBuilder"], str]:
+    import lib.rhea.config as RC
+    from lib.rhea.query_generator import RheaQueryBuilder
+    import lib.uniprot.config as UC
+    from lib.uniprot.query_generator import UniprotQueryBuilder
 
-def save_data(data: pd.DataFrame, path: pathlib.Path) -> None:
-    with open(path, mode="bw") as writer:
-        if path.suffix == ".xlsx":
-            data.to_excel(writer, index=False, engine="openpyxl")
-        if path.suffix == ".csv":
-            data.to_csv(writer, index=False)
+    config = None
+    builder = None
+    url: str = None
+    if repository == "uniprot":
+        with profiling.span("load_config"):
+            with open(config_path, encoding="utf-8") as config_file:
+                json_config = json.load(config_file)
+            config = UC.UniprotSearchConfig.schema().load(json_config)
+        builder, url = UniprotQueryBuilder, UC.URL
+    if repository == "rhea":
+        with profiling.span("load_config"):
+            with open(config_path, encoding="utf-8") as config_file:
+                json_config = json.load(config_file)
+            config = RC.RheaSearchConfig.schema().load(json_config)
+        builder, url = RheaQueryBuilder, RC.URL
+    return config, builder, url
+
+
+def load_query(config_path: pathlib.Path, repository: str) -> T.Tuple[SelectQuery, str]:
+    config, builder, url = load_config(config_path, repository)
+    return get_query(config, builder), url
+
+
+def redirect_endpoints(
+    query: SelectQuery, url: str, repository: str, endpoints: T.Dict[str, str]
+) -> T.Tuple[SelectQuery, str]:
+    import lib.sparql_query as SQ
+    from lib.common import Repository as KnownRepository
+    from lib.knowledge_base import urls
+
+    endpoints = dict(endpoints)
+    if "" in endpoints:
+        endpoints[repository] = endpoints.pop("")
+    services = {
+        urls[KnownRepository[name.upper()]]: endpoint
+        for name, endpoint in endpoints.items()
+    }
+    return SQ.redirect_services(query, services), endpoints.get(repository, url)
 
 
 @click.command(help="Generate query based on config saved in config_path")
@@ -82,32 +143,431 @@ def save_data(data: pd.DataFrame, path: pathlib.Path) -> None:
     "--out-path",
     type=click.Path(path_type=pathlib.Path),
     callback=cb_validate_path,
-    help="Path where to save result of the query, must have either csv or xlsx extension",
+    help="Path where to save result of the query, must have csv, csv.gz, csv.zst, "
+    "tsv, tsv.gz, tsv.zst, xlsx, parquet, feather, arrow, fasta or fasta.gz "
+    "extension",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(PARQUET_CODECS, case_sensitive=False),
+    default=None,
+    help="Compression codec of parquet (default snappy) and feather/arrow (default lz4) outputs",
+)
+@click.option(
+    "--row-group-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Maximal number of rows in a parquet row group or an arrow record batch",
+)
+@click.option(
+    "--compact",
+    is_flag=True,
+    default=False,
+    help="Strip known IRI namespaces and store integer and repeated columns compactly",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Number of result rows parsed and written at once",
+)
+@click.option(
+    "--page-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Fetch the result in pages of this many rows using LIMIT/OFFSET",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Maximal number of requests running at the same time",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Split VALUES blocks longer than this into batches queried separately",
+)
+@click.option(
+    "--join-strategy",
+    type=click.Choice(JOIN_STRATEGIES, case_sensitive=False),
+    default=DEFAULT_JOIN_STRATEGY,
+    show_default=True,
+    help="Join results of other repositories in a SERVICE block (federated), "
+    "by querying each repository and joining locally (client) or choose by "
+    "COUNT estimates of both parts (auto)",
+)
+@click.option(
+    "--optimize/--no-optimize",
+    default=True,
+    show_default=True,
+    help="Order graph patterns so that the most selective ones are evaluated first",
+)
+@click.option(
+    "--distinct",
+    "distinct_strategy",
+    type=click.Choice(DISTINCT_STRATEGIES, case_sensitive=False),
+    default=DEFAULT_DISTINCT_STRATEGY,
+    show_default=True,
+    help="Remove repeated rows with DISTINCT on the server, on the client while "
+    "the result is downloaded or keep them (none)",
+)
+@click.option(
+    "--aggregate",
+    is_flag=True,
+    default=False,
+    help="Group the result by protein or reaction on the server and collapse "
+    "the remaining columns into lists",
+)
+@click.option(
+    "--expand",
+    is_flag=True,
+    default=False,
+    help="Expand lists of an aggregated result back into one row per value",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    show_default=True,
+    help="Reuse results of identical queries stored in the result cache",
+)
+@click.option(
+    "--refresh-cache",
+    is_flag=True,
+    default=False,
+    help="Execute the query even if it is cached and store the new result",
+)
+@click.option(
+    "--clear-cache",
+    is_flag=True,
+    default=False,
+    help="Remove all cached results before running",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+    default=DEFAULT_CACHE_DIR,
+    show_default=True,
+    help="Directory with cached results",
+)
+@click.option(
+    "--cache-ttl",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_TTL / 3600,
+    show_default=True,
+    help="Hours after which a cached result expires",
+)
+@click.option(
+    "--cache-max-size",
+    type=click.IntRange(min=0),
+    default=DEFAULT_MAX_SIZE // 1024**2,
+    show_default=True,
+    help="Size of the cache in MiB, least recently used results are evicted",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=1),
+    default=DEFAULT_RETRIES,
+    show_default=True,
+    help="Number of attempts for a request failing with 429 or 5xx status",
+)
+@click.option(
+    "--post-threshold",
+    type=click.IntRange(min=0),
+    default=DEFAULT_POST_THRESHOLD,
+    show_default=True,
+    help="Send queries longer than this many encoded characters using POST",
+)
+@click.option(
+    "--estimate",
+    is_flag=True,
+    default=False,
+    help="Count the result rows first, print the count and use it to choose "
+    "between a single query, pages and batches and to show the remaining time",
+)
+@click.option(
+    "--progress/--no-progress",
+    default=None,
+    help="Show downloaded rows and bytes, throughput and remaining time "
+    "[default: when writing to a terminal]",
+)
+@click.option(
+    "--endpoint",
+    "endpoints",
+    multiple=True,
+    metavar="[REPOSITORY=]URL",
+    callback=cb_parse_endpoints,
+    help="Query URL instead of the public endpoint of the repository, "
+    "SERVICE blocks of a repository given by name are redirected too",
+)
+@click.option(
+    "--local-store",
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+    default=None,
+    help="Run the query in a local RDF store saved in this directory "
+    "instead of the endpoint",
+)
+@click.option(
+    "--load-dump",
+    "dumps",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+    help="Load an RDF dump (N-Triples, Turtle, RDF/XML, optionally gzip, xz "
+    "or bz2 compressed) into the local store before running the query",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help="Refresh a previous UniProt output with entries modified since its "
+    "last run and drop entries no longer matching the config",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Record finished pages and batches next to the output and continue "
+    "an interrupted run started with this option from them",
+)
+@click.option(
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, writable=True, path_type=pathlib.Path),
+    default=None,
+    help="Save time and peak memory of every stage of the run as JSON",
 )
 def run(
     config_path: pathlib.Path,
     repository: str,
     out_path: T.Optional[pathlib.Path],
     print_query: bool,
+    compression: T.Optional[str],
+    row_group_size: T.Optional[int],
+    compact: bool,
+    chunk_size: int,
+    page_size: T.Optional[int],
+    concurrency: int,
+    batch_size: T.Optional[int],
+    join_strategy: str,
+    optimize: bool,
+    distinct_strategy: str,
+    aggregate: bool,
+    expand: bool,
+    cache: bool,
+    refresh_cache: bool,
+    clear_cache: bool,
+    cache_dir: pathlib.Path,
+    cache_ttl: float,
+    cache_max_size: int,
+    retries: int,
+    post_threshold: int,
+    estimate: bool,
+    progress: T.Optional[bool],
+    endpoints: T.Dict[str, str],
+    local_store: T.Optional[pathlib.Path],
+    dumps: T.Tuple[pathlib.Path, ...],
+    incremental: bool,
+    resume: bool,
+    profile_path: T.Optional[pathlib.Path],
 ) -> None:
-    query: SelectQuery = None
-    url: str = None
-    if repository == "uniprot":
-        with open(config_path, encoding="utf-8") as config_file:
-            json_config = json.load(config_file)
-        config = UC.UniprotSearchConfig.schema().load(json_config)
-        query = get_query(config, UniprotQueryBuilder)
-    if repository == "rhea":
-        with open(config_path, encoding="utf-8") as config_file:
-            json_config = json.load(config_file)
-        config = RC.RheaSearchConfig.schema().load(json_config)
-        query, url = get_query(config, RheaQueryBuilder), RC.URL
-
-    if print_query:
-        print(query.get_pretty_text())
-    if out_path:
-        data = collect_data(query, url)
-        save_data(data, out_path)
+    if dumps and local_store is None:
+        raise click.BadParameter(
+            "Dumps can only be loaded into a local store", param_hint="--load-dump"
+        )
+    if incremental and (not out_path or repository != "uniprot" or compact):
+        raise click.BadParameter(
+            "Only UniProt outputs saved without --compact can be refreshed",
+            param_hint="--incremental",
+        )
+    if resume and (not out_path or local_store is not None):
+        raise click.BadParameter(
+            "Only runs saving an output from the endpoints can be resumed",
+            param_hint="--resume",
+        )
+    if expand and not aggregate:
+        raise click.BadParameter(
+            "Only aggregated results can be expanded", param_hint="--expand"
+        )
+    with profiling.profile(profile_path):
+        store = None
+        if local_store is not None:
+            from lib.local_store import LocalStore
+
+            store = LocalStore(local_store)
+            for dump in dumps:
+                with profiling.span("loading"):
+                    store.load(dump)
+        config, builder, url = load_config(config_path, repository)
+        distinct_strategy = distinct_strategy.lower()
+        builder = functools.partial(
+            builder,
+            distinct=distinct_strategy == "server",
+            optimize=optimize,
+            aggregate=aggregate,
+        )
+        try:
+            query = get_query(config, builder)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--aggregate")
+        if endpoints:
+            query, url = redirect_endpoints(query, url, repository, endpoints)
+
+        result_cache = None
+        if clear_cache or (out_path and cache):
+            from lib.cache import ResultCache
+
+            result_cache = ResultCache(
+                cache_dir, cache_ttl * 3600, cache_max_size * 1024**2
+            )
+            if clear_cache:
+                result_cache.clear()
+
+        if print_query:
+            with profiling.span("rendering"):
+                text = query.get_pretty_text()
+            print(text)
+        if not (out_path or estimate):
+            return
+
+        from lib.execution import (
+            ExecutionOptions,
+            choose_strategy,
+            estimate_rows,
+            execute,
+        )
+        from lib.progress import Progress
+        from lib.sinks import (
+            SinkOptions,
+            save_data,
+            validate_sink_columns,
+            validate_sink_options,
+            validate_sink_refresh,
+        )
+        from lib.transport import RetryPolicy, SparqlClient
+
+        sink_options = SinkOptions(compression, row_group_size)
+        if out_path:
+            try:
+                validate_sink_options(out_path, sink_options)
+            except ValueError as error:
+                raise click.BadParameter(str(error), param_hint="--compression")
+            try:
+                validate_sink_columns(out_path, [v.name for v in query.variables])
+            except ValueError as error:
+                raise click.BadParameter(str(error), param_hint="--out-path")
+            if incremental:
+                try:
+                    validate_sink_refresh(out_path)
+                except ValueError as error:
+                    raise click.BadParameter(str(error), param_hint="--incremental")
+        options = ExecutionOptions(
+            chunk_size=chunk_size,
+            page_size=page_size,
+            concurrency=concurrency,
+            batch_size=batch_size,
+            join_strategy=join_strategy.lower(),
+            cache=result_cache if cache else None,
+            refresh_cache=refresh_cache,
+            local_store=store,
+            deduplicate=distinct_strategy == "client",
+            client=SparqlClient(
+                pool_size=concurrency,
+                post_threshold=post_threshold,
+                retry=RetryPolicy(attempts=retries),
+            ),
+        )
+        total = None
+        if estimate:
+            total = estimate_rows(query, url, options)
+            click.echo(f"Estimated rows: {total}", err=True)
+            options = choose_strategy(query, total, options)
+        if not out_path:
+            return
+
+        if progress is None:
+            progress = sys.stderr.isatty()
+        if progress:
+            options.progress = Progress(total)
+        if resume:
+            from lib.checkpoint import Checkpoint
+
+            options.checkpoint = Checkpoint.for_output(out_path)
+            if options.checkpoint.units:
+                click.echo(
+                    f"Resuming with {len(options.checkpoint.units)} finished requests",
+                    err=True,
+                )
+        data = None
+        if incremental:
+            from lib import incremental as INC
+            from lib.sinks import read_data
+
+            try:
+                key = INC.key_column(config)
+            except ValueError as error:
+                raise click.BadParameter(str(error), param_hint="--incremental")
+            started = INC.run_date()
+            digest = INC.config_digest(
+                config,
+                url,
+                {
+                    "distinct": distinct_strategy,
+                    "aggregate": aggregate,
+                    "expand": expand,
+                },
+            )
+            state = INC.load_state(out_path)
+            if state is not None and state.config_digest == digest:
+                delta, _ = redirect_endpoints(
+                    get_query(INC.delta_config(config, state.modified_since), builder),
+                    url,
+                    repository,
+                    endpoints,
+                )
+                listing, _ = redirect_endpoints(
+                    get_query(INC.listing_config(config), builder),
+                    url,
+                    repository,
+                    endpoints,
+                )
+                # Neither query may come from the cache, both have to reflect
+                # the current release.
+                uncached = dataclasses.replace(options, cache=None)
+                data = INC.merge_delta(
+                    read_data(out_path, chunk_size),
+                    execute(delta, url, uncached),
+                    execute(listing, url, uncached),
+                    key,
+                )
+        if data is None:
+            data = execute(query, url, options)
+        if options.progress is not None:
+            data = options.progress.track(data)
+        if expand:
+            from lib.aggregation import ListExpander
+            from lib.execution import RowDeduplicator
+
+            data = map(ListExpander(query), data)
+            # Keys matching values of several batches come with the rows of
+            # each batch, rows found by more of them repeat once expanded.
+            if options.batch_size:
+                data = map(RowDeduplicator(), data)
+        if compact:
+            from lib.compact import FrameCompactor
+
+            data = map(FrameCompactor(query.prefixes), data)
+        try:
+            save_data(data, out_path, sink_options)
+        finally:
+            if options.progress is not None:
+                options.progress.close()
+        if incremental:
+            INC.save_state(out_path, INC.RefreshState(started, digest))
+        if options.checkpoint is not None:
+            options.checkpoint.clear()
 
 
 if __name__ == "__main__":
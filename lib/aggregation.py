@@ -0,0 +1,79 @@
+import typing as T
+import numpy as np
+import pandas as pd
+import lib.sparql_query as SQ
+
+# Separators and escapes inside values are escaped in the lists, so that every
+# list splits into the values it was joined from.
+ESCAPE = "\\"
+
+
+def row_concat(query: SQ.SelectQuery) -> T.Optional[SQ.RowConcat]:
+    return next((v for v in query.variables if isinstance(v, SQ.RowConcat)), None)
+
+
+def escape_values(values: pd.Series, separator: str) -> pd.Series:
+    return values.str.replace(ESCAPE, ESCAPE * 2, regex=False).str.replace(
+        separator, ESCAPE + separator, regex=False
+    )
+
+
+class ListCollector:
+    def __init__(self, query: SQ.SelectQuery):
+        self.concat = row_concat(query)
+
+    def sort(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        # Rows of a group arrive in any order, sorting them gives equal groups
+        # equal values.
+        if self.concat is None or chunk.empty:
+            return chunk
+        name, separator = self.concat.name, self.concat.separator
+        rows = chunk[name].fillna("").str.split(separator, regex=False)
+        return chunk.assign(**{name: rows.map(sorted).str.join(separator)})
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        if self.concat is None:
+            return chunk
+        concat = self.concat
+        chunk = self.sort(chunk).reset_index(drop=True)
+        rows = chunk[concat.name].str.split(concat.separator, regex=False).explode()
+        fields = rows.str.split(
+            SQ.FIELD_SEPARATOR, n=len(concat.fields) - 1, expand=True, regex=False
+        )
+        fields = fields.reindex(columns=range(len(concat.fields))).fillna("")
+        fields.columns = list(concat.fields)
+        fields = fields.apply(escape_values, separator=concat.list_separator)
+        # Every list is joined from the same sorted rows, so the n-th values of
+        # all lists of a row come from the same row.
+        lists = fields.groupby(level=0, sort=False).agg(concat.list_separator.join)
+        return chunk.drop(columns=concat.name).join(lists)[list(concat.columns)]
+
+
+class ListExpander:
+    def __init__(self, query: SQ.SelectQuery):
+        concat = row_concat(query)
+        self.fields = list(concat.fields) if concat is not None else []
+        self.separator = concat.list_separator if concat is not None else ""
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        if not self.fields or chunk.empty:
+            return chunk
+        # Escaped escapes and separators are masked by the control characters
+        # the rows were packed with, which no value holds, while splitting.
+        lists = {
+            name: chunk[name]
+            .str.replace(ESCAPE * 2, SQ.FIELD_SEPARATOR, regex=False)
+            .str.replace(ESCAPE + self.separator, SQ.ROW_SEPARATOR, regex=False)
+            .str.split(self.separator, regex=False)
+            for name in self.fields
+        }
+        rows = chunk.assign(**lists).explode(self.fields, ignore_index=True)
+        values = {
+            name: rows[name]
+            .str.replace(SQ.ROW_SEPARATOR, self.separator, regex=False)
+            .str.replace(SQ.FIELD_SEPARATOR, ESCAPE, regex=False)
+            for name in self.fields
+        }
+        rows = rows.assign(**values)
+        # Unbound values were packed as empty ones.
+        return rows.replace({name: {"": np.nan} for name in self.fields})
@@ -0,0 +1,140 @@
+import asyncio
+import pathlib
+import tempfile
+import typing as T
+from dataclasses import dataclass, field
+import aiohttp
+import dataclasses_json as DJ
+from .cache import ResultCache
+from .common import Repository
+from .defaults import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_ENDPOINT_CONCURRENCY,
+    DEFAULT_POST_THRESHOLD,
+)
+from .execution import read_csv_chunks
+from .sinks import SinkOptions, save_data
+from .sparql_query import SelectQuery
+from .transport import RETRY_STATUSES, RetryPolicy, query_parameters, use_post
+
+BLOCK_SIZE = 1 << 16
+
+
+@DJ.dataclass_json(letter_case=DJ.LetterCase.CAMEL)
+@dataclass
+class BatchJob(DJ.DataClassJsonMixin):
+    config: str
+    repository: str
+    output: str
+
+
+@dataclass
+class PreparedJob:
+    repository: Repository
+    query: SelectQuery
+    url: str
+    output: pathlib.Path
+
+
+@dataclass
+class BatchOptions:
+    concurrency: T.Dict[Repository, int] = field(
+        default_factory=lambda: {
+            repository: DEFAULT_ENDPOINT_CONCURRENCY for repository in Repository
+        }
+    )
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    post_threshold: int = DEFAULT_POST_THRESHOLD
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    cache: T.Optional[ResultCache] = None
+    sink: SinkOptions = SinkOptions()
+
+
+async def fetch(
+    session: aiohttp.ClientSession,
+    url: str,
+    query_text: str,
+    options: BatchOptions,
+    target: T.IO[bytes],
+) -> None:
+    parameters = query_parameters(query_text)
+    attempt = 0
+    while True:
+        attempt += 1
+        target.seek(0)
+        target.truncate()
+        if use_post(parameters, options.post_threshold):
+            request = session.post(url, data=parameters)
+        else:
+            request = session.get(url, params=parameters)
+        try:
+            async with request as response:
+                if (
+                    response.status not in RETRY_STATUSES
+                    or attempt >= options.retry.attempts
+                ):
+                    response.raise_for_status()
+                    async for block in response.content.iter_chunked(BLOCK_SIZE):
+                        target.write(block)
+                    return
+                delay = options.retry.delay(
+                    attempt, response.headers.get("Retry-After")
+                )
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= options.retry.attempts:
+                raise
+            delay = options.retry.delay(attempt)
+        await asyncio.sleep(delay)
+
+
+async def run_job(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    job: PreparedJob,
+    options: BatchOptions,
+) -> None:
+    key = None
+    if options.cache is not None:
+        key = options.cache.key(job.url, job.query)
+        cached = options.cache.get(key)
+        if cached is not None:
+            await asyncio.to_thread(save_data, cached, job.output, options.sink)
+            return
+    # The body is spooled to disk so that only the download holds an
+    # endpoint slot, parsing and writing happen after it is released.
+    with tempfile.TemporaryFile() as body:
+        async with semaphore:
+            await fetch(session, job.url, job.query.get_pretty_text(), options, body)
+        body.seek(0)
+        chunks = read_csv_chunks(body, options.chunk_size)
+        if key is not None:
+            chunks = options.cache.store(key, chunks)
+        await asyncio.to_thread(save_data, chunks, job.output, options.sink)
+
+
+async def run_batch(
+    jobs: T.Sequence[PreparedJob], options: BatchOptions
+) -> T.AsyncIterator[T.Tuple[PreparedJob, T.Optional[BaseException]]]:
+    semaphores = {
+        repository: asyncio.Semaphore(limit)
+        for repository, limit in options.concurrency.items()
+    }
+
+    async def run_reported(
+        job: PreparedJob,
+    ) -> T.Tuple[PreparedJob, T.Optional[BaseException]]:
+        try:
+            await run_job(session, semaphores[job.repository], job, options)
+        except Exception as error:  # pylint: disable=broad-except
+            return job, error
+        return job, None
+
+    connector = aiohttp.TCPConnector(limit=sum(options.concurrency.values()))
+    timeout = aiohttp.ClientTimeout(total=None, connect=DEFAULT_CONNECT_TIMEOUT)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers={"Accept": "text/csv"}
+    ) as session:
+        tasks = [asyncio.create_task(run_reported(job)) for job in jobs]
+        for task in asyncio.as_completed(tasks):
+            yield await task
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import pathlib
+import threading
+import time
+import typing as T
+import pandas as pd
+import pyarrow as pa
+from .defaults import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE, DEFAULT_TTL
+from .sparql_query import SelectQuery
+
+CREATED_KEY = b"created"
+
+
+def normalize_query_text(text: str) -> str:
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class ResultCache:
+    def __init__(
+        self,
+        directory: pathlib.Path = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def key(self, url: str, query: SelectQuery) -> str:
+        text = normalize_query_text(query.get_pretty_text())
+        return hashlib.sha256(f"{url}\n{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.arrow"
+
+    def entries(self) -> T.List[pathlib.Path]:
+        if not self.directory.exists():
+            return []
+        return list(self.directory.glob("*.arrow"))
+
+    def get(self, key: str) -> T.Optional[T.Iterator[pd.DataFrame]]:
+        path = self.path(key)
+        try:
+            with pa.memory_map(str(path)) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        created = float(metadata.get(CREATED_KEY, 0))
+        if time.time() - created > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        # Modification time records the last use, eviction goes by it.
+        os.utime(path)
+        return self._read(path)
+
+    def _read(self, path: pathlib.Path) -> T.Iterator[pd.DataFrame]:
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index).to_pandas()
+
+    def store(
+        self, key: str, chunks: T.Iterable[pd.DataFrame]
+    ) -> T.Iterator[pd.DataFrame]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        # Pages and batches of one process can repeat a query on several
+        # threads, each of them writes its own file.
+        temporary_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        writer: T.Optional[pa.ipc.RecordBatchFileWriter] = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    schema = pa.schema(
+                        [(str(column), pa.string()) for column in chunk.columns],
+                        metadata={CREATED_KEY: str(time.time())},
+                    )
+                    writer = pa.ipc.new_file(str(temporary_path), schema)
+                writer.write_table(
+                    pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                )
+                yield chunk
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(temporary_path, path)
+                self.evict()
+        finally:
+            if writer is not None:
+                writer.close()
+            temporary_path.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        entries = [(path, path.stat()) for path in self.entries()]
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        total_size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= stat.st_size
+
+    def clear(self) -> None:
+        for path in self.entries():
+            path.unlink(missing_ok=True)
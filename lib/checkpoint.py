@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+import typing as T
+import pandas as pd
+import pyarrow as pa
+from .cache import normalize_query_text
+from .sparql_query import SelectQuery
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+def checkpoint_path(out_path: pathlib.Path) -> pathlib.Path:
+    return out_path.with_name(f".checkpoint-{out_path.name}")
+
+
+class Checkpoint:
+    def __init__(self, directory: pathlib.Path):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.units = self._read_journal()
+
+    @classmethod
+    def for_output(cls, out_path: pathlib.Path) -> "Checkpoint":
+        return cls(checkpoint_path(out_path))
+
+    def key(self, url: str, query: SelectQuery) -> str:
+        text = normalize_query_text(query.get_pretty_text())
+        return hashlib.sha256(f"{url}\n{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.arrow"
+
+    def _read_journal(self) -> T.Dict[str, int]:
+        units: T.Dict[str, int] = {}
+        try:
+            with open(self.directory / JOURNAL_NAME, encoding="utf-8") as journal:
+                lines = journal.readlines()
+        except FileNotFoundError:
+            return units
+        for line in lines:
+            # The last line is cut short when the run was killed writing it.
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if self.path(entry["unit"]).exists():
+                units[entry["unit"]] = entry["rows"]
+        return units
+
+    def get(self, key: str) -> T.Optional[pd.DataFrame]:
+        if key not in self.units:
+            return None
+        with pa.memory_map(str(self.path(key))) as source:
+            return pa.ipc.open_file(source).read_pandas()
+
+    def store(self, key: str, frame: pd.DataFrame) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        temporary_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        schema = pa.schema([(str(column), pa.string()) for column in frame.columns])
+        with pa.ipc.new_file(str(temporary_path), schema) as writer:
+            writer.write_table(
+                pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            )
+        os.replace(temporary_path, path)
+        # A unit is finished only once its journal entry is on disk, a unit
+        # file without one is fetched again.
+        with self.lock:
+            with open(self.directory / JOURNAL_NAME, "a", encoding="utf-8") as journal:
+                journal.write(json.dumps({"unit": key, "rows": len(frame)}) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self.units[key] = len(frame)
+
+    def fetch(
+        self, url: str, query: SelectQuery, collect: T.Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        key = self.key(url, query)
+        frame = self.get(key)
+        if frame is None:
+            frame = collect()
+            self.store(key, frame)
+        return frame
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -3,6 +3,9 @@ from dataclasses import dataclass
 import typing as T
 import lib.sparql_query as SQ
 
+# Fraction of all proteins or reactions a single value of a VALUES block keeps.
+VALUE_SELECTIVITY = 1e-4
+
 
 @unique
 class SparqlEntity(Enum):
@@ -24,6 +27,9 @@ class Recipe:
     required_entities: T.List[SparqlEntity]
     recipe_constructor: T.Callable[[T.Dict[SparqlEntity, SQ.Variable]],
                                    T.Union[SQ.Triplet, SQ.GraphPattern]]
+    # Estimated fraction of the bindings the pattern keeps, lower values
+    # are evaluated earlier by the optimizer.
+    selectivity: float = 1.0
 
 
 def create_triplet_recipe(in_ent: SparqlEntity, out_ent: SparqlEntity,
@@ -0,0 +1,83 @@
+import dataclasses
+import typing as T
+from dataclasses import dataclass
+import pandas as pd
+import lib.sparql_query as SQ
+
+DEFAULT_CATEGORICAL_RATIO = 0.5
+# Integers written back the same way, without leading zeros or a plus sign.
+INTEGER = r"-?[1-9]\d{0,17}|0"
+
+
+@dataclass(frozen=True)
+class ColumnEncoding:
+    namespace: T.Optional[str] = None
+    integer: bool = False
+    categorical: bool = False
+
+
+class FrameCompactor:
+    def __init__(
+        self,
+        prefixes: T.Sequence[SQ.Prefix],
+        categorical_ratio: float = DEFAULT_CATEGORICAL_RATIO,
+    ):
+        # Longer namespaces first so the most specific one is stripped.
+        self.namespaces = sorted(
+            (prefix.iri_ref.strip("<>") for prefix in prefixes), key=len, reverse=True
+        )
+        self.categorical_ratio = categorical_ratio
+        self.encodings: T.Optional[T.Dict[str, ColumnEncoding]] = None
+        self.categories: T.Dict[str, pd.Index] = {}
+
+    def _choose_encoding(self, column: pd.Series) -> ColumnEncoding:
+        values = column.dropna()
+        if values.empty:
+            return ColumnEncoding()
+        namespace = next(
+            (n for n in self.namespaces if values.str.startswith(n).all()), None
+        )
+        if namespace is not None:
+            values = values.str.removeprefix(namespace)
+        if values.str.fullmatch(INTEGER).all():
+            return ColumnEncoding(namespace, integer=True)
+        categorical = values.nunique() <= self.categorical_ratio * len(values)
+        return ColumnEncoding(namespace, categorical=categorical)
+
+    def _encode(self, column: pd.Series, encoding: ColumnEncoding) -> pd.Series:
+        if encoding.namespace is not None:
+            column = column.str.removeprefix(encoding.namespace)
+        if encoding.integer:
+            if column.dropna().str.fullmatch(INTEGER).all():
+                return column.astype(pd.Int64Dtype())
+            # Encodings are chosen on the first chunk, a column with other
+            # values later on is kept as text from then on.
+            encoding = dataclasses.replace(encoding, integer=False)
+            self.encodings[str(column.name)] = encoding
+        if encoding.categorical:
+            return column.astype(self._extend_categories(column))
+        return column
+
+    def _extend_categories(self, column: pd.Series) -> pd.CategoricalDtype:
+        # Categories only ever grow by appending, so the dictionary of every
+        # chunk starts with the dictionary of the previous one.
+        name = str(column.name)
+        known = self.categories.get(name, pd.Index([], dtype=object))
+        values = pd.Index(column.dropna().unique())
+        categories = known.append(values.difference(known, sort=False))
+        self.categories[name] = categories
+        return pd.CategoricalDtype(categories)
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        # Encodings are chosen on the first chunk and kept for the rest of
+        # the result so that every chunk written to a sink has one schema.
+        if self.encodings is None:
+            self.encodings = {
+                str(name): self._choose_encoding(chunk[name]) for name in chunk.columns
+            }
+        return pd.DataFrame(
+            {
+                name: self._encode(chunk[name], self.encodings[str(name)])
+                for name in chunk.columns
+            }
+        )
@@ -0,0 +1,48 @@
+import os
+import pathlib
+
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_PAGE_SIZE = 100_000
+DEFAULT_ENDPOINT_CONCURRENCY = 2
+
+DEFAULT_CACHE_DIR = (
+    pathlib.Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+    / "bioinformatic-data-collector"
+)
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 1024**3
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_POST_THRESHOLD = 2048
+DEFAULT_CONNECT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 5
+
+PARQUET_CODECS = ["snappy", "gzip", "brotli", "zstd", "lz4", "none"]
+FEATHER_CODECS = ["lz4", "zstd", "none"]
+EXCEL_MAX_ROWS = 1_048_576
+FASTA_LINE_WIDTH = 60
+# Level of the gzip command, the default of the gzip module is several times
+# slower for little smaller files.
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Text handed to the compression thread at once and the number of blocks
+# waiting for it.
+WRITE_BLOCK_SIZE = 1024**2
+WRITE_QUEUE_SIZE = 8
+
+# Values of a list collapsed by an aggregated query, UniProt uses the same one
+# in its own exports.
+DEFAULT_LIST_SEPARATOR = ";"
+
+JOIN_STRATEGIES = ["auto", "federated", "client"]
+DEFAULT_JOIN_STRATEGY = "auto"
+# Estimated rows of the own side of a federated query up to which the auto
+# strategy leaves the join to SERVICE, the endpoint sends their bindings to
+# the other repository.
+FEDERATED_MAX_ROWS = 10_000
+# Keys of the build side sent in one VALUES block of the other side.
+JOIN_KEYS_BATCH_SIZE = 1000
+
+DISTINCT_STRATEGIES = ["server", "client", "none"]
+DEFAULT_DISTINCT_STRATEGY = "server"
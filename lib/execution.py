@@ -0,0 +1,423 @@
+import collections
+import concurrent.futures as CF
+import contextlib
+import dataclasses
+import itertools as IT
+import math
+import typing as T
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+import requests
+import lib.sparql_query as SQ
+from . import profiling
+from .aggregation import ListCollector
+from .cache import ResultCache
+from .checkpoint import Checkpoint
+from .defaults import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_JOIN_STRATEGY,
+    DEFAULT_PAGE_SIZE,
+    FEDERATED_MAX_ROWS,
+    JOIN_KEYS_BATCH_SIZE,
+)
+from .join import JoinPlan, hash_join, restrict_to_keys, split_federated_query
+from .progress import CountingReader, Progress
+from .sparql_query import SelectQuery
+from .transport import SparqlClient
+
+if T.TYPE_CHECKING:
+    from .local_store import LocalStore
+
+TItem = T.TypeVar("TItem")
+TResult = T.TypeVar("TResult")
+
+
+@dataclass
+class ExecutionOptions:
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    page_size: T.Optional[int] = None
+    concurrency: int = DEFAULT_CONCURRENCY
+    batch_size: T.Optional[int] = None
+    cache: T.Optional[ResultCache] = None
+    refresh_cache: bool = False
+    join_strategy: str = DEFAULT_JOIN_STRATEGY
+    progress: T.Optional[Progress] = None
+    local_store: T.Optional["LocalStore"] = None
+    checkpoint: T.Optional[Checkpoint] = None
+    # Rows repeated in the result are removed on the client, for queries sent
+    # without DISTINCT.
+    deduplicate: bool = False
+    client: SparqlClient = field(default_factory=SparqlClient)
+
+
+class RowDeduplicator:
+    # Rows are remembered by their 64 bit hashes kept in sorted arrays, about
+    # eight bytes per distinct row. A new array is merged into the previous
+    # one while they have similar sizes, so only a logarithmic number of
+    # arrays is searched for every chunk.
+    def __init__(self) -> None:
+        self.runs: T.List[np.ndarray] = []
+
+    def _seen(self, hashes: np.ndarray) -> np.ndarray:
+        seen = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            seen |= run[positions] == hashes
+        return seen
+
+    def _add(self, hashes: np.ndarray) -> None:
+        run = np.sort(hashes)
+        while self.runs and len(self.runs[-1]) <= 2 * len(run):
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind="stable")
+        self.runs.append(run)
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        if chunk.empty:
+            return chunk
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        keep = ~self._seen(hashes) & ~pd.Series(hashes).duplicated().to_numpy()
+        if keep.any():
+            self._add(hashes[keep])
+        return chunk[keep]
+
+
+def read_csv_chunks(
+    source: T.IO[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> T.Iterator[pd.DataFrame]:
+    # Every column is kept as text so that all chunks share one schema,
+    # type inference on a single chunk would not hold for the next one.
+    with pd.read_csv(
+        source, sep=",", header=0, dtype=str, chunksize=chunk_size
+    ) as reader:
+        yield from reader
+
+
+def stream_data(
+    query: SelectQuery,
+    url: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    client: T.Optional[SparqlClient] = None,
+    progress: T.Optional[Progress] = None,
+) -> T.Iterator[pd.DataFrame]:
+    client = client or SparqlClient()
+    with profiling.span("rendering"):
+        text = query.get_pretty_text()
+    with profiling.span("time_to_first_byte"):
+        response = client.request(url, text)
+    with response:
+        response.raw.decode_content = True
+        source = response.raw
+        if progress is not None:
+            source = CountingReader(source, progress)
+        if not profiling.enabled():
+            yield from read_csv_chunks(source, chunk_size)
+            return
+        reader = profiling.TimedReader(source)
+        yield from profiling.profile_stream(read_csv_chunks(reader, chunk_size), reader)
+
+
+def collect_data(
+    query: SelectQuery,
+    url: str,
+    client: T.Optional[SparqlClient] = None,
+    progress: T.Optional[Progress] = None,
+) -> pd.DataFrame:
+    return pd.concat(
+        stream_data(query, url, DEFAULT_CHUNK_SIZE, client, progress),
+        ignore_index=True,
+    )
+
+
+def collect_unit(
+    query: SelectQuery,
+    url: str,
+    client: T.Optional[SparqlClient] = None,
+    progress: T.Optional[Progress] = None,
+    checkpoint: T.Optional[Checkpoint] = None,
+) -> pd.DataFrame:
+    if checkpoint is None:
+        return collect_data(query, url, client, progress)
+    return checkpoint.fetch(
+        url, query, lambda: collect_data(query, url, client, progress)
+    )
+
+
+def estimate_rows(query: SelectQuery, url: str, options: ExecutionOptions) -> int:
+    if options.local_store is not None:
+        counts = options.local_store.stream(query.count())
+    else:
+        counts = stream_data(query.count(), url, client=options.client)
+    return int(pd.concat(counts).iloc[0, 0])
+
+
+def ordered_map(
+    function: T.Callable[[TItem], TResult],
+    items: T.Iterable[TItem],
+    concurrency: int,
+) -> T.Iterator[TResult]:
+    executor = CF.ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        items = iter(items)
+        pending = collections.deque(
+            executor.submit(function, item) for item in IT.islice(items, concurrency)
+        )
+        while pending:
+            result = pending.popleft().result()
+            for item in IT.islice(items, 1):
+                pending.append(executor.submit(function, item))
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def stream_pages(
+    query: SelectQuery,
+    url: str,
+    page_size: int,
+    concurrency: int,
+    client: T.Optional[SparqlClient] = None,
+    progress: T.Optional[Progress] = None,
+    checkpoint: T.Optional[Checkpoint] = None,
+) -> T.Iterator[pd.DataFrame]:
+    client = client or SparqlClient(pool_size=concurrency)
+    pages = ordered_map(
+        lambda number: collect_unit(
+            query.page(number, page_size), url, client, progress, checkpoint
+        ),
+        IT.count(),
+        concurrency,
+    )
+    with contextlib.closing(pages):
+        for page in pages:
+            yield page
+            if len(page) < page_size:
+                break
+
+
+def split_inline_data(query: SelectQuery, batch_size: int) -> T.List[SelectQuery]:
+    blocks = [
+        pattern
+        for pattern in SQ.iter_patterns(query.graph_pattern)
+        if isinstance(pattern, SQ.InlineData) and len(pattern.values) > batch_size
+    ]
+    return [
+        query.with_graph_pattern(
+            SQ.replace_patterns(query.graph_pattern, dict(zip(blocks, batches)))
+        )
+        for batches in IT.product(*(block.split(batch_size) for block in blocks))
+    ]
+
+
+def stream_batches(
+    queries: T.Sequence[SelectQuery], url: str, options: ExecutionOptions
+) -> T.Iterator[pd.DataFrame]:
+    def collect_batch(query: SelectQuery) -> pd.DataFrame:
+        if options.page_size:
+            return pd.concat(
+                stream_pages(
+                    query,
+                    url,
+                    options.page_size,
+                    1,
+                    options.client,
+                    options.progress,
+                    options.checkpoint,
+                ),
+                ignore_index=True,
+            )
+        return collect_unit(
+            query, url, options.client, options.progress, options.checkpoint
+        )
+
+    batches = ordered_map(collect_batch, queries, options.concurrency)
+    if queries[0].group_by:
+        batches = map(ListCollector(queries[0]).sort, batches)
+    # Rows matching values from several batches would be returned once by the
+    # original query, so they have to be removed when it asks for DISTINCT.
+    if queries[0].distinct:
+        deduplicate = RowDeduplicator()
+        batches = map(deduplicate, batches)
+    return batches
+
+
+def choose_strategy(
+    query: SelectQuery, estimate: int, options: ExecutionOptions
+) -> ExecutionOptions:
+    if options.page_size or options.batch_size or estimate <= DEFAULT_PAGE_SIZE:
+        return options
+    values = [
+        len(pattern.values)
+        for pattern in SQ.iter_patterns(query.graph_pattern)
+        if isinstance(pattern, SQ.InlineData)
+    ]
+    # Rows are assumed to be spread evenly over the values, so that every
+    # batch returns about a page of rows. With too few values to split into
+    # that many batches the result is paged instead.
+    batches = math.ceil(estimate / DEFAULT_PAGE_SIZE)
+    if not values or max(values) < batches:
+        return dataclasses.replace(options, page_size=DEFAULT_PAGE_SIZE)
+    return dataclasses.replace(options, batch_size=math.ceil(max(values) / batches))
+
+
+def estimate_sides(plan: JoinPlan, options: ExecutionOptions) -> T.List[int]:
+    return list(
+        ordered_map(
+            lambda side: estimate_rows(side[0], side[1], options),
+            plan.sides,
+            len(plan.sides),
+        )
+    )
+
+
+def stream_join(
+    plan: JoinPlan,
+    options: ExecutionOptions,
+    estimates: T.Optional[T.List[int]] = None,
+) -> T.Iterator[pd.DataFrame]:
+    if estimates is None:
+        estimates = estimate_sides(plan, options)
+    side_options = dataclasses.replace(
+        options, join_strategy="federated", deduplicate=False
+    )
+    # The side with fewer rows is kept in memory and the other one streamed
+    # through it. When it is the own side of the query, the other repository
+    # is only asked for rows matching its keys.
+    build_index = min(range(len(plan.sides)), key=lambda index: estimates[index])
+    (probe_index,) = (i for i in range(len(plan.sides)) if i != build_index)
+    build_query, build_url = plan.sides[build_index]
+    probe_query, probe_url = plan.sides[probe_index]
+    with contextlib.ExitStack() as stack:
+        executor = stack.enter_context(CF.ThreadPoolExecutor(max_workers=1))
+        building = executor.submit(collect_side, build_query, build_url, side_options)
+        if build_index == 0:
+            build = building.result()
+            probe_query = restrict_to_keys(probe_query, plan.keys, build)
+            probe_options = dataclasses.replace(
+                side_options, batch_size=options.batch_size or JOIN_KEYS_BATCH_SIZE
+            )
+            probe = execute(probe_query, probe_url, probe_options)
+            if hasattr(probe, "close"):
+                stack.callback(probe.close)
+        else:
+            # The own side is not restricted, so it is requested while the
+            # other one is collected, holding only its first chunk meanwhile.
+            source = execute(probe_query, probe_url, side_options)
+            if hasattr(source, "close"):
+                stack.callback(source.close)
+            first = list(IT.islice(source, 1))
+            build = building.result()
+            probe = IT.chain(first, source)
+        rows = hash_join(build, probe, plan.keys, plan.columns)
+        # Projecting the join keys away can repeat rows of the joined result.
+        if plan.sides[0][0].distinct:
+            rows = map(RowDeduplicator(), rows)
+        yield from rows
+
+
+def collect_side(
+    query: SelectQuery, url: str, options: ExecutionOptions
+) -> pd.DataFrame:
+    chunks = list(execute(query, url, options))
+    if not chunks:
+        return pd.DataFrame(columns=[v.name for v in query.variables])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def stream_auto(
+    query: SelectQuery, url: str, plan: JoinPlan, options: ExecutionOptions
+) -> T.Iterator[pd.DataFrame]:
+    # The endpoint sends the bindings of its own side to the other repository,
+    # a federated query with many of them is slow or times out.
+    try:
+        estimates = estimate_sides(plan, options)
+    except (requests.RequestException, ValueError, IndexError):
+        # Without counts nothing tells the strategies apart, the query is sent
+        # as written.
+        yield from _execute_direct(query, url, options)
+        return
+    if estimates[0] > FEDERATED_MAX_ROWS:
+        yield from stream_join(plan, options, estimates)
+        return
+    yield from fall_back(
+        _execute_direct(query, url, options),
+        lambda: stream_join(plan, options, estimates),
+    )
+
+
+def fall_back(
+    primary: T.Iterator[pd.DataFrame],
+    fallback: T.Callable[[], T.Iterator[pd.DataFrame]],
+) -> T.Iterator[pd.DataFrame]:
+    # Only a failure before the first row can be recovered from, once rows
+    # were passed on the result cannot be started over.
+    try:
+        first = next(primary)
+    except StopIteration:
+        return
+    except requests.RequestException:
+        yield from fallback()
+        return
+    yield first
+    yield from primary
+
+
+def execute(
+    query: SelectQuery, url: str, options: ExecutionOptions
+) -> T.Iterator[pd.DataFrame]:
+    chunks = _execute_cached(query, url, options)
+    if query.group_by:
+        chunks = map(ListCollector(query), chunks)
+    if options.deduplicate:
+        return map(RowDeduplicator(), chunks)
+    return chunks
+
+
+def _execute_cached(
+    query: SelectQuery, url: str, options: ExecutionOptions
+) -> T.Iterator[pd.DataFrame]:
+    # Results of a local store may differ from the endpoint, they are never
+    # cached under its URL.
+    if options.cache is None or options.local_store is not None:
+        return _execute(query, url, options)
+    key = options.cache.key(url, query)
+    if not options.refresh_cache:
+        cached = options.cache.get(key)
+        if cached is not None:
+            return cached
+    return options.cache.store(key, _execute(query, url, options))
+
+
+def _execute(
+    query: SelectQuery, url: str, options: ExecutionOptions
+) -> T.Iterator[pd.DataFrame]:
+    if options.local_store is not None:
+        return options.local_store.stream(query, options.chunk_size)
+    if options.join_strategy != "federated":
+        plan = split_federated_query(query, url)
+        if plan is not None:
+            if options.join_strategy == "client":
+                return stream_join(plan, options)
+            return stream_auto(query, url, plan, options)
+    return _execute_direct(query, url, options)
+
+
+def _execute_direct(
+    query: SelectQuery, url: str, options: ExecutionOptions
+) -> T.Iterator[pd.DataFrame]:
+    if options.batch_size:
+        queries = split_inline_data(query, options.batch_size)
+        if len(queries) > 1:
+            return stream_batches(queries, url, options)
+    if options.page_size:
+        return stream_pages(
+            query,
+            url,
+            options.page_size,
+            options.concurrency,
+            options.client,
+            options.progress,
+            options.checkpoint,
+        )
+    return stream_data(query, url, options.chunk_size, options.client, options.progress)
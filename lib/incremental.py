@@ -0,0 +1,107 @@
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import typing as T
+from dataclasses import dataclass
+import dataclasses_json as DJ
+import pandas as pd
+import lib.uniprot.config as UC
+from .outputs import partial_path
+from .uniprot.query_generator import UniprotQueryBuilder
+
+STATE_SUFFIX = ".state.json"
+# Keys of proteins in the order they are preferred as the merge key.
+KEY_FEATURES = [UC.Feature.PROTEIN_ID, UC.Feature.PROTEIN]
+
+
+@DJ.dataclass_json(letter_case=DJ.LetterCase.CAMEL)
+@dataclass
+class RefreshState(DJ.DataClassJsonMixin):
+    modified_since: str
+    config_digest: str
+
+
+def state_path(out_path: pathlib.Path) -> pathlib.Path:
+    return out_path.with_name(out_path.name + STATE_SUFFIX)
+
+
+def load_state(out_path: pathlib.Path) -> T.Optional[RefreshState]:
+    path = state_path(out_path)
+    if not path.exists() or not out_path.exists():
+        return None
+    return RefreshState.from_json(path.read_text(encoding="utf-8"))
+
+
+def save_state(out_path: pathlib.Path, state: RefreshState) -> None:
+    path = state_path(out_path)
+    temporary_path = partial_path(path)
+    temporary_path.write_text(state.to_json(indent=4) + "\n", encoding="utf-8")
+    os.replace(temporary_path, path)
+
+
+def run_date() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def config_digest(
+    config: UC.UniprotSearchConfig, url: str, flags: T.Mapping[str, T.Any]
+) -> str:
+    # Flags shaping the rows of the output are part of the digest, a previous
+    # output with other rows can not be merged with the delta.
+    text = config.to_json(sort_keys=True)
+    flags_text = json.dumps(flags, sort_keys=True)
+    return hashlib.sha256(f"{url}\n{text}\n{flags_text}".encode("utf-8")).hexdigest()
+
+
+def key_feature(config: UC.UniprotSearchConfig) -> UC.Feature:
+    columns = config.data_selector.columns
+    for feature in KEY_FEATURES:
+        if feature in columns:
+            return feature
+    names = " or ".join(feature.value for feature in KEY_FEATURES)
+    raise ValueError(f"Incremental refresh needs the {names} column")
+
+
+def key_column(config: UC.UniprotSearchConfig) -> str:
+    return UniprotQueryBuilder.entity_mappings[key_feature(config)].value
+
+
+def delta_config(config: UC.UniprotSearchConfig, since: str) -> UC.UniprotSearchConfig:
+    return dataclasses.replace(
+        config,
+        data_filter=dataclasses.replace(config.data_filter, modified_since=since),
+    )
+
+
+def listing_config(config: UC.UniprotSearchConfig) -> UC.UniprotSearchConfig:
+    # Only the keys of all entries still matching the filter are listed, the
+    # rows of the remaining ones are removed.
+    return dataclasses.replace(
+        config,
+        data_selector=UC.UniprotSelection([key_feature(config)]),
+        data_filter=dataclasses.replace(config.data_filter, modified_since=None),
+    )
+
+
+def collect_keys(chunks: T.Iterable[pd.DataFrame], key: str) -> pd.Index:
+    keys = [chunk[key] for chunk in chunks]
+    return pd.Index(pd.concat(keys).unique() if keys else [])
+
+
+def merge_delta(
+    previous: T.Iterable[pd.DataFrame],
+    delta: T.Iterable[pd.DataFrame],
+    listing: T.Iterable[pd.DataFrame],
+    key: str,
+) -> T.Iterator[pd.DataFrame]:
+    current = collect_keys(listing, key)
+    delta_chunks = list(delta)
+    changed = collect_keys(delta_chunks, key)
+    for chunk in previous:
+        keep = chunk[key].isin(current) & ~chunk[key].isin(changed)
+        yield chunk[keep]
+    for chunk in delta_chunks:
+        yield chunk[chunk[key].isin(current)]
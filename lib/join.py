@@ -0,0 +1,94 @@
+import re
+import typing as T
+from dataclasses import dataclass
+import pandas as pd
+import lib.sparql_query as SQ
+from .sparql_query import SelectQuery
+
+IRI = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:[^\s<>\"{}|^`\\]*")
+
+
+@dataclass(frozen=True)
+class JoinPlan:
+    sides: T.Tuple[T.Tuple[SelectQuery, str], ...]
+    keys: T.List[str]
+    columns: T.List[str]
+
+
+def _side_query(
+    query: SelectQuery, pattern: SQ.GraphPattern, keys: T.List[str]
+) -> SelectQuery:
+    names = {v.name for v in SQ.iter_variables(pattern)}
+    variables = [SQ.Variable(key) for key in keys] + [
+        v for v in query.variables if v.name in names and v.name not in keys
+    ]
+    return SelectQuery(query.prefixes, variables, pattern, query.distinct)
+
+
+def split_federated_query(query: SelectQuery, url: str) -> T.Optional[JoinPlan]:
+    if query.order_by or query.group_by:
+        return None
+    if query.limit is not None or query.offset is not None:
+        return None
+    if not isinstance(query.graph_pattern, SQ.SimpleGraphPattern):
+        return None
+    patterns = query.graph_pattern.patterns
+    services = [p for p in patterns if isinstance(p, SQ.ServiceGraphPattern)]
+    if len(services) != 1:
+        return None
+    (service,) = services
+    local = SQ.SimpleGraphPattern([p for p in patterns if p is not service])
+    remote_names = {v.name for v in SQ.iter_variables(service.graph_pattern)}
+    keys = list(
+        dict.fromkeys(
+            v.name for v in SQ.iter_variables(local) if v.name in remote_names
+        )
+    )
+    # Without a shared variable the join would be a cross product, which is
+    # better left to the endpoint.
+    if not keys:
+        return None
+    return JoinPlan(
+        (
+            (_side_query(query, local, keys), url),
+            (_side_query(query, service.graph_pattern, keys), service.service),
+        ),
+        keys,
+        [v.name for v in query.variables],
+    )
+
+
+def restrict_to_keys(
+    query: SelectQuery, keys: T.List[str], build: pd.DataFrame
+) -> SelectQuery:
+    # Only keys that are IRIs can be written back into a query unchanged,
+    # literals lost their datatype in the CSV result.
+    if len(keys) != 1:
+        return query
+    values = build[keys[0]].dropna().unique()
+    if not all(IRI.fullmatch(value) for value in values):
+        return query
+    inline = SQ.InlineData(SQ.Variable(keys[0]), [f"<{value}>" for value in values])
+    patterns = (
+        query.graph_pattern.patterns
+        if isinstance(query.graph_pattern, SQ.SimpleGraphPattern)
+        else [query.graph_pattern]
+    )
+    return query.with_graph_pattern(SQ.SimpleGraphPattern([inline, *patterns]))
+
+
+def hash_join(
+    build: pd.DataFrame,
+    probe: T.Iterable[pd.DataFrame],
+    keys: T.List[str],
+    columns: T.List[str],
+) -> T.Iterator[pd.DataFrame]:
+    if build.empty:
+        yield pd.DataFrame(columns=columns, dtype=str)
+        return
+    # The index keeps its hash table between lookups, so it is built once and
+    # every chunk of the other side is only probed against it.
+    table = build.dropna(subset=keys).set_index(keys)
+    for chunk in probe:
+        joined = chunk.join(table, on=keys, how="inner")
+        yield joined[columns].reset_index(drop=True)
@@ -1,14 +1,35 @@
-from .uniprot.representation import knowledge_graph as uniprot_graph
-from .rhea.representation import knowledge_graph as rhea_graph
+import functools as FT
+import networkx
+from networkx import MultiDiGraph
+from .uniprot.representation import build_knowledge_graph as build_uniprot_graph
+from .rhea.representation import build_knowledge_graph as build_rhea_graph
 from .rhea.entities import RheaEntity
 from .uniprot.entities import UniprotEntity
 from .common import Repository
+from .rhea.config import URL as RHEA_URL
+from .uniprot.config import URL as UNIPROT_URL
+
+graph_builders = {
+    Repository.RHEA: build_rhea_graph,
+    Repository.UNIPROT: build_uniprot_graph,
+}
+
+
+@FT.lru_cache(maxsize=None)
+def get_knowledge_graph(repository: Repository) -> MultiDiGraph:
+    return graph_builders[repository]()
+
+
+@FT.lru_cache(maxsize=None)
+def get_federated_graph() -> MultiDiGraph:
+    # Graphs of all repositories share the entities linking them, so paths
+    # from one root can continue into the other repositories.
+    return networkx.compose_all([get_knowledge_graph(r) for r in graph_builders])
 
-knowledge_graphs = {Repository.RHEA: rhea_graph, Repository.UNIPROT: uniprot_graph}
 
 urls = {
-    Repository.RHEA: "https://sparql.rhea-db.org/",
-    Repository.UNIPROT: "https://sparql.uniprot.org/",
+    Repository.RHEA: RHEA_URL,
+    Repository.UNIPROT: UNIPROT_URL,
 }
 
 type_mappings = {RheaEntity: Repository.RHEA, UniprotEntity: Repository.UNIPROT}
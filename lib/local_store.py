@@ -0,0 +1,76 @@
+import bz2
+import gzip
+import lzma
+import os
+import pathlib
+import threading
+import typing as T
+import pandas as pd
+import pyoxigraph as OX
+import lib.sparql_query as SQ
+from .defaults import DEFAULT_CHUNK_SIZE
+from .execution import read_csv_chunks
+from .sparql_query import SelectQuery
+
+DECOMPRESSORS: T.Dict[str, T.Callable[..., T.IO[bytes]]] = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".bz2": bz2.open,
+}
+
+
+def dump_format(path: pathlib.Path) -> OX.RdfFormat:
+    suffixes = [s for s in path.suffixes if s not in DECOMPRESSORS]
+    format_ = OX.RdfFormat.from_extension(suffixes[-1][1:]) if suffixes else None
+    if format_ is None:
+        raise ValueError(f"Unknown RDF format of {path}")
+    return format_
+
+
+class LocalStore:
+    def __init__(self, path: pathlib.Path):
+        self.store = OX.Store(str(path))
+
+    def load(self, path: pathlib.Path) -> None:
+        format_ = dump_format(path)
+        open_dump = DECOMPRESSORS.get(path.suffix, open)
+        with open_dump(path, "rb") as dump:
+            self.store.bulk_load(dump, format_)
+        self.store.optimize()
+
+    def stream(
+        self, query: SelectQuery, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> T.Iterator[pd.DataFrame]:
+        # Both repositories are loaded into one store, so patterns meant for
+        # another endpoint are evaluated locally too.
+        text = SQ.inline_services(query).get_pretty_text()
+        read_end, write_end = os.pipe()
+        errors: T.List[BaseException] = []
+
+        def serialize() -> None:
+            try:
+                with open(write_end, "wb") as output:
+                    # Solutions cannot leave the thread that created them.
+                    solutions = self.store.query(text, use_default_graph_as_union=True)
+                    try:
+                        solutions.serialize(output, OX.QueryResultsFormat.CSV)
+                    finally:
+                        del solutions
+            except BrokenPipeError:
+                pass
+            except BaseException as error:  # pylint: disable=broad-except
+                errors.append(error)
+
+        # Results are written as CSV from another thread and parsed like a
+        # response of an endpoint, so both backends yield the same chunks.
+        writer = threading.Thread(target=serialize, daemon=True)
+        writer.start()
+        try:
+            with open(read_end, "rb") as source:
+                yield from read_csv_chunks(source, chunk_size)
+        finally:
+            writer.join()
+            # An error of the query leaves the CSV empty or cut, it is the
+            # cause that is reported instead of the parser error.
+            if errors:
+                raise errors[0]
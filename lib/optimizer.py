@@ -0,0 +1,77 @@
+import typing as T
+import lib.sparql_query as SQ
+
+HintedPattern = T.Tuple[SQ.Pattern, float]
+
+
+def required_variables(pattern: SQ.Pattern) -> T.Set[str]:
+    if isinstance(pattern, (SQ.BindExpression, SQ.FilterExpression)):
+        return {v.name for v in pattern.in_vars}
+    return set()
+
+
+def bound_variables(pattern: SQ.Pattern) -> T.Set[str]:
+    if isinstance(pattern, SQ.BindExpression):
+        return {pattern.out_var.name}
+    if isinstance(pattern, SQ.FilterExpression):
+        return set()
+    return {v.name for v in SQ.iter_variables(pattern)}
+
+
+def order_segment(
+    patterns: T.Sequence[HintedPattern], bound: T.Set[str]
+) -> T.List[SQ.Pattern]:
+    remaining = list(enumerate(patterns))
+    ordered: T.List[SQ.Pattern] = []
+    while remaining:
+        ready = [item for item in remaining if required_variables(item[1][0]) <= bound]
+        # Expressions only shrink or annotate the bindings, they are placed
+        # as soon as their inputs are bound.
+        expression = next(
+            (
+                item
+                for item in ready
+                if isinstance(item[1][0], (SQ.BindExpression, SQ.FilterExpression))
+            ),
+            None,
+        )
+        if expression is not None:
+            chosen = expression
+        elif ready:
+            # The most selective pattern goes first. Filters, such as a VALUES
+            # block, keep few bindings even in a cross product, only other
+            # patterns wait until they join with the bindings so far.
+            chosen = min(
+                ready,
+                key=lambda item: (
+                    bool(bound)
+                    and item[1][1] >= 1.0
+                    and not bound_variables(item[1][0]) & bound,
+                    item[1][1],
+                    item[0],
+                ),
+            )
+        else:
+            chosen = remaining[0]
+        remaining.remove(chosen)
+        ordered.append(chosen[1][0])
+        bound |= bound_variables(chosen[1][0])
+    return ordered
+
+
+def order_patterns(patterns: T.Sequence[HintedPattern]) -> T.List[SQ.Pattern]:
+    # Moving a pattern over an OPTIONAL changes the result, only the patterns
+    # between two of them are reordered.
+    ordered: T.List[SQ.Pattern] = []
+    bound: T.Set[str] = set()
+    segment: T.List[HintedPattern] = []
+    for pattern, selectivity in patterns:
+        if isinstance(pattern, SQ.OptionalGraphPattern):
+            ordered.extend(order_segment(segment, bound))
+            ordered.append(pattern)
+            bound |= bound_variables(pattern)
+            segment = []
+        else:
+            segment.append((pattern, selectivity))
+    ordered.extend(order_segment(segment, bound))
+    return ordered
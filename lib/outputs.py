@@ -0,0 +1,35 @@
+import pathlib
+
+# Suffixes of the outputs lib.sinks can write, kept apart from it so that
+# validating an output path does not import pandas and pyarrow.
+OUTPUT_SUFFIXES = [
+    ".csv",
+    ".csv.gz",
+    ".csv.zst",
+    ".tsv",
+    ".tsv.gz",
+    ".tsv.zst",
+    ".xlsx",
+    ".parquet",
+    ".feather",
+    ".arrow",
+    ".fasta",
+    ".fa",
+    ".fasta.gz",
+    ".fa.gz",
+]
+
+
+def partial_path(out_path: pathlib.Path) -> pathlib.Path:
+    return out_path.with_name(f".partial-{out_path.name}")
+
+
+def sink_suffix(path: pathlib.Path) -> str:
+    # Compressed outputs are told apart by all of their suffixes, e.g. the
+    # .fasta.gz one, the longest known suffix wins.
+    suffixes = path.suffixes
+    for start in range(len(suffixes)):
+        suffix = "".join(suffixes[start:])
+        if suffix in OUTPUT_SUFFIXES:
+            return suffix
+    return path.suffix
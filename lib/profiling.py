@@ -0,0 +1,215 @@
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import typing as T
+from dataclasses import dataclass, field
+
+SAMPLE_INTERVAL = 0.01
+
+
+@dataclass(frozen=True)
+class SpanRecord:
+    name: str
+    seconds: float
+    peak_memory: T.Optional[int]
+
+
+Hook = T.Callable[[SpanRecord], None]
+
+_hooks: T.List[Hook] = []
+
+
+def current_memory() -> T.Optional[int]:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_memory() -> int:
+    # ru_maxrss is in kilobytes everywhere except macOS, which uses bytes.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Watch:
+    def __init__(self) -> None:
+        self.peak = current_memory()
+
+    def update(self, memory: T.Optional[int]) -> None:
+        if memory is not None and (self.peak is None or memory > self.peak):
+            self.peak = memory
+
+
+class MemorySampler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.watches: T.Set[Watch] = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            memory = current_memory()
+            with self.lock:
+                for watch in self.watches:
+                    watch.update(memory)
+
+    def start(self) -> Watch:
+        watch = Watch()
+        with self.lock:
+            self.watches.add(watch)
+        return watch
+
+    def stop(self, watch: Watch) -> T.Optional[int]:
+        with self.lock:
+            self.watches.discard(watch)
+        watch.update(current_memory())
+        return watch.peak
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+_sampler: T.Optional[MemorySampler] = None
+
+
+def add_hook(hook: Hook) -> None:
+    global _sampler
+    if _sampler is None:
+        _sampler = MemorySampler()
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    global _sampler
+    _hooks.remove(hook)
+    if not _hooks and _sampler is not None:
+        _sampler.close()
+        _sampler = None
+
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+
+def emit(record: SpanRecord) -> None:
+    for hook in list(_hooks):
+        hook(record)
+
+
+@contextlib.contextmanager
+def span(name: str) -> T.Iterator[None]:
+    sampler = _sampler
+    if sampler is None:
+        yield
+        return
+    watch = sampler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        emit(SpanRecord(name, seconds, sampler.stop(watch)))
+
+
+class TimedReader(io.RawIOBase):
+    def __init__(self, source: T.Any):
+        super().__init__()
+        self.source = source
+        self.seconds = 0.0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: T.Any) -> int:
+        start = time.perf_counter()
+        try:
+            return self.source.readinto(buffer)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def profile_stream(chunks: T.Iterator[T.Any], reader: TimedReader) -> T.Iterator[T.Any]:
+    # Parsing pulls the body from the reader, so the time spent producing
+    # chunks is split into the part spent reading and the rest.
+    sampler = _sampler
+    if sampler is None:
+        yield from chunks
+        return
+    watch = sampler.start()
+    seconds = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            seconds += time.perf_counter() - start
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        peak = sampler.stop(watch)
+        emit(SpanRecord("transfer", reader.seconds, peak))
+        emit(SpanRecord("parsing", seconds - reader.seconds, peak))
+
+
+@dataclass
+class StageSummary:
+    name: str
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    peak_memory: T.Optional[int] = None
+
+
+@dataclass
+class ProfileReport:
+    stages: T.Dict[str, StageSummary] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __call__(self, record: SpanRecord) -> None:
+        with self.lock:
+            stage = self.stages.setdefault(record.name, StageSummary(record.name))
+            stage.count += 1
+            stage.seconds += record.seconds
+            stage.max_seconds = max(stage.max_seconds, record.seconds)
+            if record.peak_memory is not None:
+                stage.peak_memory = max(stage.peak_memory or 0, record.peak_memory)
+
+    def to_dict(self) -> T.Dict[str, T.Any]:
+        with self.lock:
+            stages = [vars(stage).copy() for stage in self.stages.values()]
+        return {
+            "wall_seconds": time.perf_counter() - self.started,
+            "peak_memory": peak_memory(),
+            "stages": stages,
+        }
+
+    def save(self, path: T.Union[str, os.PathLike]) -> None:
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.to_dict(), report_file, indent=4)
+            report_file.write("\n")
+
+
+@contextlib.contextmanager
+def profile(path: T.Optional[T.Union[str, os.PathLike]]) -> T.Iterator[None]:
+    if path is None:
+        yield
+        return
+    report = ProfileReport()
+    add_hook(report)
+    try:
+        yield
+    finally:
+        remove_hook(report)
+        report.save(path)
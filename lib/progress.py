@@ -0,0 +1,102 @@
+import io
+import sys
+import threading
+import time
+import typing as T
+import pandas as pd
+
+REFRESH_INTERVAL = 0.5
+
+
+def format_bytes(count: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if count < 1024:
+            return f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TiB"
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+class Progress:
+    def __init__(
+        self,
+        total: T.Optional[int] = None,
+        stream: T.Optional[T.TextIO] = None,
+        interval: float = REFRESH_INTERVAL,
+    ):
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.refreshed = 0.0
+        # Bytes are reported by every thread downloading pages or batches.
+        self.lock = threading.Lock()
+
+    def add_bytes(self, count: int) -> None:
+        with self.lock:
+            self.bytes += count
+        self.refresh()
+
+    def add_rows(self, count: int) -> None:
+        with self.lock:
+            self.rows += count
+        self.refresh()
+
+    def track(self, chunks: T.Iterable[pd.DataFrame]) -> T.Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            self.add_rows(len(chunk))
+            yield chunk
+
+    def describe(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rate = self.rows / elapsed
+        parts = [f"{self.rows:,} rows"]
+        if self.total:
+            parts[0] += f" of ~{self.total:,} ({min(self.rows / self.total, 1):.0%})"
+        parts.append(f"{rate:,.0f} rows/s")
+        parts.append(format_bytes(self.bytes))
+        if self.total and rate > 0:
+            remaining = max(self.total - self.rows, 0) / rate
+            parts.append(f"ETA {format_duration(remaining)}")
+        return ", ".join(parts)
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.refreshed < self.interval:
+                return
+            self.refreshed = now
+            self.stream.write("\r" + self.describe() + "\033[K")
+            self.stream.flush()
+
+    def close(self) -> None:
+        self.refresh(force=True)
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+class CountingReader(io.RawIOBase):
+    def __init__(self, source: T.Any, progress: Progress):
+        super().__init__()
+        self.source = source
+        self.progress = progress
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: T.Any) -> int:
+        count = self.source.readinto(buffer)
+        # tell() of a raw response counts the bytes received on the wire,
+        # before they are decompressed.
+        position = self.source.tell()
+        self.progress.add_bytes(position - self.position)
+        self.position = position
+        return count
@@ -1,20 +1,88 @@
 import abc
+import functools as FT
 import lib.sparql_query as SQ
 import typing as T
+from dataclasses import dataclass
 from enum import Enum
 from .common import SparqlEntity, Recipe, Repository
-from .knowledge_base import knowledge_graphs
+from .defaults import DEFAULT_LIST_SEPARATOR
+from .knowledge_base import get_federated_graph, urls
+from .optimizer import HintedPattern, order_patterns
 import networkx
 
 TEntity = T.TypeVar("TEntity", bound=Enum)
 TConfig = T.TypeVar("TConfig")
 
 
+@dataclass(frozen=True)
+class QueryPlan:
+    mapping: T.Dict[SparqlEntity, SQ.Variable]
+    recipe_patterns: T.Dict[Repository, T.List[HintedPattern]]
+
+
+@FT.lru_cache(maxsize=None)
+def get_shortest_paths(
+    root_entity: SparqlEntity,
+) -> T.Dict[SparqlEntity, T.List[SparqlEntity]]:
+    return networkx.algorithms.shortest_path(get_federated_graph(), source=root_entity)
+
+
+@FT.lru_cache(maxsize=1024)
+def get_query_plan(
+    repository: Repository,
+    root_entity: SparqlEntity,
+    projected_entities: T.FrozenSet[SparqlEntity],
+    filtering_entities: T.FrozenSet[SparqlEntity],
+) -> QueryPlan:
+    graph = get_federated_graph()
+    shortest_paths = get_shortest_paths(root_entity)
+    # Plans are shared by every ordering of the same entities, so the paths
+    # are walked in a fixed order to get the same query for all of them.
+    important_entities = sorted(
+        projected_entities | filtering_entities,
+        key=lambda e: (type(e).__name__, e.value),
+    )
+    edges = [
+        (source, target, graph.get_edge_data(source, target, key=0))
+        for entity in important_entities
+        for (source, target) in zip(shortest_paths[entity], shortest_paths[entity][1:])
+    ]
+    knowledge_graph = networkx.DiGraph()
+    knowledge_graph.add_edges_from(edges)
+
+    entities = knowledge_graph.nodes()
+    mapping = {e: SQ.Variable(str(e)) for e in entities}
+    recipe_patterns: T.Dict[Repository, T.List[HintedPattern]] = {repository: []}
+    for u, v in networkx.algorithms.dfs_edges(knowledge_graph, root_entity):
+        recipe = knowledge_graph.get_edge_data(u, v)["recipe"]
+        recipe_patterns.setdefault(recipe.repository, []).append(
+            (recipe.recipe_constructor(mapping), recipe.selectivity)
+        )
+    return QueryPlan(mapping, recipe_patterns)
+
+
+def federate_patterns(
+    repository: Repository, patterns: T.Dict[Repository, T.List[SQ.Pattern]]
+) -> SQ.SimpleGraphPattern:
+    # Patterns of other repositories are evaluated by their own endpoints,
+    # the queried endpoint joins their results on the shared variables.
+    services = [
+        SQ.ServiceGraphPattern(urls[other], SQ.SimpleGraphPattern(other_patterns))
+        for other, other_patterns in patterns.items()
+        if other != repository and other_patterns
+    ]
+    return SQ.SimpleGraphPattern(patterns[repository] + services)
+
+
 class SparqlQueryBuilder(abc.ABC, T.Generic[TConfig]):
 
     root_entity: SparqlEntity
     entity_type: type
     repository: Repository
+    entity_mappings: T.Dict[Enum, SparqlEntity]
+    # Entities with a single value for every instance of the root, they stay
+    # columns of an aggregated query and the rest is collapsed into lists.
+    grouping_entities: T.FrozenSet[SparqlEntity]
     prefixes = [
         SQ.Prefix("up", "<http://purl.uniprot.org/core/>"),
         SQ.Prefix("rdfs", "<http://www.w3.org/2000/01/rdf-schema#>"),
@@ -22,11 +90,22 @@ class SparqlQueryBuilder(abc.ABC, T.Generic[TConfig]):
         SQ.Prefix("skos", "<http://www.w3.org/2004/02/skos/core#>"),
         SQ.Prefix("chebi", "<http://purl.obolibrary.org/obo/chebi/>"),
         SQ.Prefix("rh", "<http://rdf.rhea-db.org/>"),
+        SQ.Prefix("uniprotkb", "<http://purl.uniprot.org/uniprot/>"),
+        SQ.Prefix("taxon", "<http://purl.uniprot.org/taxonomy/>"),
+        SQ.Prefix("CHEBI", "<http://purl.obolibrary.org/obo/CHEBI_>"),
     ]
 
-    def __init__(self, config: TConfig, distinct: bool):
+    def __init__(
+        self,
+        config: TConfig,
+        distinct: bool,
+        optimize: bool = True,
+        aggregate: bool = False,
+    ):
         self.config = config
         self.distinct = distinct
+        self.optimize = optimize
+        self.aggregate = aggregate
 
     @abc.abstractmethod
     def _get_filtering_recipes(self) -> T.List[Recipe]:
@@ -40,33 +119,46 @@ class SparqlQueryBuilder(abc.ABC, T.Generic[TConfig]):
         filters = self._get_filtering_recipes()
         filtering_entities = [e for f in filters for e in f.required_entities]
         projected_entities = self._get_entities()
-        graph = knowledge_graphs[self.repository]
-        shortest_paths = networkx.algorithms.shortest_path(
-            graph, source=self.root_entity
+        plan = get_query_plan(
+            self.repository,
+            self.root_entity,
+            frozenset(projected_entities),
+            frozenset(filtering_entities),
         )
-        important_paths = {
-            v: shortest_paths[v] for v in filtering_entities + projected_entities
-        }
-        edges = [
-            (source, target, graph.get_edge_data(source, target, key=0))
-            for path in important_paths.values()
-            for (source, target) in zip(path, path[1:])
-        ]
-        knowledge_graph = networkx.DiGraph()
-        knowledge_graph.add_edges_from(edges)
-
-        entities = knowledge_graph.nodes()
-        mapping = {e: SQ.Variable(str(e)) for e in entities}
-        recipe_patterns = [
-            knowledge_graph.get_edge_data(u, v)["recipe"].recipe_constructor(mapping)
-            for (u, v) in networkx.algorithms.dfs_edges(
-                knowledge_graph, self.root_entity
+        hinted = {r: list(p) for r, p in plan.recipe_patterns.items()}
+        for f in filters:
+            hinted.setdefault(f.repository, []).append(
+                (f.recipe_constructor(plan.mapping), f.selectivity)
             )
-        ]
-        filter_patterns = [f.recipe_constructor(mapping) for f in filters]
+        patterns = {
+            r: order_patterns(p) if self.optimize else [pattern for pattern, _ in p]
+            for r, p in hinted.items()
+        }
 
-        return SQ.SelectQuery(
+        query = SQ.SelectQuery(
             self.prefixes,
-            [mapping[e] for e in projected_entities],
-            SQ.SimpleGraphPattern(recipe_patterns + filter_patterns),
+            [plan.mapping[e] for e in projected_entities],
+            federate_patterns(self.repository, patterns),
+            self.distinct,
         )
+        if self.aggregate:
+            query = self._aggregate(query, projected_entities, plan.mapping)
+        return query
+
+    def _aggregate(
+        self,
+        query: SQ.SelectQuery,
+        projected_entities: T.List[SparqlEntity],
+        mapping: T.Dict[SparqlEntity, SQ.Variable],
+    ) -> SQ.SelectQuery:
+        keys = [mapping[e] for e in projected_entities if e in self.grouping_entities]
+        if len(keys) == len(projected_entities):
+            return query
+        if not keys:
+            names = ", ".join(
+                str(feature.value)
+                for feature, entity in self.entity_mappings.items()
+                if entity in self.grouping_entities
+            )
+            raise ValueError(f"Aggregation needs one of the {names} columns")
+        return query.aggregate(keys, DEFAULT_LIST_SEPARATOR)
@@ -19,9 +19,16 @@ class RheaQueryBuilder(SparqlQueryBuilder[C.RheaSearchConfig]):
     entity_type = RheaEntity
     root_entity = RheaEntity.START
     repository = Repository.RHEA
+    grouping_entities = frozenset([RheaEntity.REACTION])
 
-    def __init__(self, config: C.RheaSearchConfig) -> None:
-        super().__init__(config, True)
+    def __init__(
+        self,
+        config: C.RheaSearchConfig,
+        distinct: bool = True,
+        optimize: bool = True,
+        aggregate: bool = False,
+    ) -> None:
+        super().__init__(config, distinct, optimize, aggregate)
 
     def _get_entities(self) -> T.List[SparqlEntity]:
         features = self.config.data_selector.columns
@@ -1,6 +1,12 @@
 from ..rhea.entities import RheaEntity
 from networkx import MultiDiGraph
-from ..common import Recipe, Repository, create_triplet_recipe, SparqlEntity
+from ..common import (
+    Recipe,
+    Repository,
+    create_triplet_recipe,
+    SparqlEntity,
+    VALUE_SELECTIVITY,
+)
 import lib.sparql_query as SQ
 import typing as T
 
@@ -21,50 +27,56 @@ def create_rhea_triplet_edge(
     )
 
 
-knowledge_graph = MultiDiGraph()
-knowledge_graph.add_nodes_from(RheaEntity)
-knowledge_graph.add_edges_from(
-    [
-        (
-            RheaEntity.START,
-            RheaEntity.REACTION,
-            {
-                "recipe": Recipe(
-                    Repository.RHEA,
-                    [RheaEntity.REACTION],
-                    lambda d: SQ.Triplet(
-                        d[RheaEntity.REACTION], "rdfs:subClassOf", "rh:Reaction"
-                    ),
-                )
-            },
-        ),
-        create_rhea_triplet_edge(
-            RheaEntity.REACTION, RheaEntity.REACTION_SIDE, "rh:side"
-        ),
-        create_rhea_triplet_edge(
-            RheaEntity.REACTION_SIDE, RheaEntity.PARTICIPANT, "rh:contains"
-        ),
-        create_rhea_triplet_edge(
-            RheaEntity.REACTION_SIDE, RheaEntity.REACTION_SIDE_ORDER, "rh:curatedOrder"
-        ),
-        create_rhea_triplet_edge(
-            RheaEntity.PARTICIPANT, RheaEntity.COMPOUND, "rh:compound"
-        ),
-        create_rhea_triplet_edge(
-            RheaEntity.COMPOUND,
-            RheaEntity.CHEBI,
-            "(rh:reactivePart?/rh:chebi)|rh:underlyingChebi",
-        ),
-        create_rhea_triplet_edge(RheaEntity.CHEBI, RheaEntity.SMILES, "chebi:smiles"),
-    ]
-)
+def build_knowledge_graph() -> MultiDiGraph:
+    knowledge_graph = MultiDiGraph()
+    knowledge_graph.add_nodes_from(RheaEntity)
+    knowledge_graph.add_edges_from(
+        [
+            (
+                RheaEntity.START,
+                RheaEntity.REACTION,
+                {
+                    "recipe": Recipe(
+                        Repository.RHEA,
+                        [RheaEntity.REACTION],
+                        lambda d: SQ.Triplet(
+                            d[RheaEntity.REACTION], "rdfs:subClassOf", "rh:Reaction"
+                        ),
+                    )
+                },
+            ),
+            create_rhea_triplet_edge(
+                RheaEntity.REACTION, RheaEntity.REACTION_SIDE, "rh:side"
+            ),
+            create_rhea_triplet_edge(
+                RheaEntity.REACTION_SIDE, RheaEntity.PARTICIPANT, "rh:contains"
+            ),
+            create_rhea_triplet_edge(
+                RheaEntity.REACTION_SIDE,
+                RheaEntity.REACTION_SIDE_ORDER,
+                "rh:curatedOrder",
+            ),
+            create_rhea_triplet_edge(
+                RheaEntity.PARTICIPANT, RheaEntity.COMPOUND, "rh:compound"
+            ),
+            create_rhea_triplet_edge(
+                RheaEntity.COMPOUND,
+                RheaEntity.CHEBI,
+                "(rh:reactivePart?/rh:chebi)|rh:underlyingChebi",
+            ),
+            create_rhea_triplet_edge(
+                RheaEntity.CHEBI, RheaEntity.SMILES, "chebi:smiles"
+            ),
+        ]
+    )
+    return knowledge_graph
 
 
 class RheaFilters:
     @classmethod
     def reaction_filter(cls, reaction_ids: T.List[str]) -> Recipe:
         return Recipe(
-            Repository.UNIPROT,
+            Repository.RHEA,
             [RheaEntity.REACTION],
             lambda d: SQ.InlineData(
                 d[RheaEntity.REACTION],
@@ -75,4 +87,5 @@ class RheaFilters:
                     )
                 ),
             ),
+            min(len(reaction_ids) * VALUE_SELECTIVITY, 1.0),
         )
@@ -0,0 +1,543 @@
+import abc
+import gzip
+import itertools as IT
+import os
+import pathlib
+import queue
+import threading
+import typing as T
+from dataclasses import dataclass
+import pandas as pd
+from . import profiling
+from .outputs import partial_path, sink_suffix
+from .defaults import (
+    DEFAULT_CHUNK_SIZE,
+    EXCEL_MAX_ROWS,
+    FASTA_LINE_WIDTH,
+    FEATHER_CODECS,
+    GZIP_LEVEL,
+    PARQUET_CODECS,
+    WRITE_BLOCK_SIZE,
+    WRITE_QUEUE_SIZE,
+    ZSTD_LEVEL,
+)
+
+# Pyarrow is imported by the Arrow sinks only, validating and writing other
+# outputs goes without it.
+if T.TYPE_CHECKING:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+
+@dataclass(frozen=True)
+class SinkOptions:
+    compression: T.Optional[str] = None
+    row_group_size: T.Optional[int] = None
+
+
+class DataSink(abc.ABC):
+    codecs: T.Sequence[str] = []
+    # Whether read returns every column written, so the output can be merged
+    # with a refreshed result.
+    refreshable = True
+
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        self.path = path
+        self.options = options
+
+    def __enter__(self) -> "DataSink":
+        return self
+
+    def __exit__(self, *exc_info: T.Any) -> None:
+        self.close()
+
+    @abc.abstractmethod
+    def write(self, chunk: pd.DataFrame) -> None:
+        pass
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def read(cls, path: pathlib.Path, chunk_size: int) -> T.Iterator[pd.DataFrame]:
+        pass
+
+    @classmethod
+    def validate_columns(cls, columns: T.Sequence[str]) -> None:
+        pass
+
+
+def open_compressor(output: T.BinaryIO, codec: str) -> T.BinaryIO:
+    if codec == "zstd":
+        import zstandard
+
+        # Frames are compressed by as many threads as there are cores.
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+        return compressor.stream_writer(output)
+    return gzip.GzipFile(fileobj=output, mode="wb", compresslevel=GZIP_LEVEL)
+
+
+class CompressedWriter:
+    # Text is compressed and written by a background thread, so compressing
+    # one chunk overlaps with downloading and parsing the next one.
+    def __init__(self, path: pathlib.Path, codec: str):
+        self.blocks: "queue.Queue[T.Optional[bytes]]" = queue.Queue(
+            maxsize=WRITE_QUEUE_SIZE
+        )
+        self.error: T.Optional[BaseException] = None
+        # The CSV writer writes every row on its own, rows are collected into
+        # larger blocks before they are handed over.
+        self.pending: T.List[str] = []
+        self.pending_size = 0
+        self.thread = threading.Thread(
+            target=self._compress, args=(path, codec), daemon=True
+        )
+        self.thread.start()
+
+    def _compress(self, path: pathlib.Path, codec: str) -> None:
+        try:
+            with open(path, mode="wb") as output:
+                with open_compressor(output, codec) as compressor:
+                    while (block := self.blocks.get()) is not None:
+                        compressor.write(block)
+        except BaseException as error:
+            self.error = error
+            # Blocks are still taken off the queue so that a writer waiting
+            # for space sees the error instead of blocking forever.
+            while self.blocks.get() is not None:
+                pass
+
+    def write(self, text: str) -> int:
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= WRITE_BLOCK_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if self.error is not None:
+            raise self.error
+        if self.pending:
+            self.blocks.put("".join(self.pending).encode("utf-8"))
+            self.pending = []
+            self.pending_size = 0
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            if self.error is None:
+                self.flush()
+            self.blocks.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def open_text_output(path: pathlib.Path) -> T.TextIO:
+    codec = COMPRESSED_SUFFIXES.get(path.suffix)
+    if codec is None:
+        return open(path, mode="w", encoding="utf-8", newline="")
+    return T.cast(T.TextIO, CompressedWriter(path, codec))
+
+
+class CsvSink(DataSink):
+    separator = ","
+
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        super().__init__(path, options)
+        self.writer = open_text_output(path)
+        self.header_written = False
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        chunk.to_csv(
+            self.writer,
+            sep=self.separator,
+            index=False,
+            header=not self.header_written,
+        )
+        self.header_written = True
+
+    def close(self) -> None:
+        self.writer.close()
+
+    @classmethod
+    def read(cls, path: pathlib.Path, chunk_size: int) -> T.Iterator[pd.DataFrame]:
+        try:
+            with pd.read_csv(
+                path, sep=cls.separator, dtype=str, chunksize=chunk_size
+            ) as reader:
+                yield from reader
+        except pd.errors.EmptyDataError:
+            return
+
+
+class TsvSink(CsvSink):
+    separator = "\t"
+
+
+class ExcelSink(DataSink):
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        import openpyxl
+
+        super().__init__(path, options)
+        # Write-only workbooks stream rows to temporary files instead of
+        # keeping the object model of every cell.
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.header: T.Optional[T.List[str]] = None
+
+    def _add_sheet(self) -> None:
+        self.sheet = self.workbook.create_sheet(
+            f"Sheet{len(self.workbook.worksheets) + 1}"
+        )
+        self.sheet.append(self.header)
+        self.sheet_rows = 1
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.header is None:
+            self.header = [str(column) for column in chunk.columns]
+            self._add_sheet()
+        # A compacted integer column turns into text once a later chunk holds
+        # other values. Cells already written cannot follow, so such columns
+        # are written as text from the start.
+        integers = [
+            name
+            for name, dtype in chunk.dtypes.items()
+            if pd.api.types.is_integer_dtype(dtype)
+        ]
+        chunk = chunk.astype({name: "string" for name in integers})
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if self.sheet_rows == EXCEL_MAX_ROWS:
+                self._add_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self) -> None:
+        if self.sheet is None:
+            self.workbook.create_sheet("Sheet1")
+        self.workbook.save(self.path)
+
+    @classmethod
+    def read(cls, path: pathlib.Path, chunk_size: int) -> T.Iterator[pd.DataFrame]:
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                while True:
+                    block = list(IT.islice(rows, chunk_size))
+                    if not block:
+                        break
+                    # Empty cells at the end of a row are not stored at all.
+                    block = [row + (None,) * (len(header) - len(row)) for row in block]
+                    yield pd.DataFrame(block, columns=header, dtype=object)
+        finally:
+            workbook.close()
+
+
+def normalize_field(field: "pa.Field") -> "pa.Field":
+    import pyarrow as pa
+
+    # A column without any value in the first chunk has no type yet, results
+    # are text unless they were converted on the way.
+    if pa.types.is_null(field.type):
+        return field.with_type(pa.string())
+    # Categorical chunks get the narrowest index type for their own number of
+    # categories, a wide one fits every following chunk.
+    if pa.types.is_dictionary(field.type):
+        return field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+    return field
+
+
+class ArrowSink(DataSink):
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        super().__init__(path, options)
+        self.schema: "T.Optional[pa.Schema]" = None
+
+    def _to_table(self, chunk: pd.DataFrame) -> "pa.Table":
+        import pyarrow as pa
+
+        if self.schema is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            self.schema = pa.schema([normalize_field(field) for field in schema])
+            self._open(self.schema)
+        try:
+            return pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            self._widen(chunk)
+            return pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+
+    def _widen(self, chunk: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        # Compaction keeps a column as text once a later chunk does not fit
+        # its integer encoding, the rows written so far are rewritten with the
+        # column as text.
+        types = pa.Schema.from_pandas(chunk, preserve_index=False)
+        widened = [
+            field.name
+            for field in self.schema
+            if pa.types.is_integer(field.type)
+            and not pa.types.is_integer(types.field(field.name).type)
+        ]
+        if not widened:
+            raise ValueError(f"Chunk does not match the schema of {self.path}")
+        schema = pa.schema(
+            [
+                field.with_type(pa.string()) if field.name in widened else field
+                for field in self.schema
+            ],
+            metadata=self.schema.metadata,
+        )
+        self.close()
+        previous = self.path.with_name(f".previous-{self.path.name}")
+        os.replace(self.path, previous)
+        self.schema = schema
+        self._open(schema)
+        for batch in self._read_batches(previous, DEFAULT_CHUNK_SIZE):
+            self._write_table(pa.Table.from_batches([batch]).cast(schema))
+        previous.unlink()
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        self._write_table(self._to_table(chunk))
+
+    @classmethod
+    def read(cls, path: pathlib.Path, chunk_size: int) -> T.Iterator[pd.DataFrame]:
+        for batch in cls._read_batches(path, chunk_size):
+            yield batch.to_pandas()
+
+    @abc.abstractmethod
+    def _open(self, schema: "pa.Schema") -> None:
+        pass
+
+    @abc.abstractmethod
+    def _write_table(self, table: "pa.Table") -> None:
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def _read_batches(
+        cls, path: pathlib.Path, chunk_size: int
+    ) -> "T.Iterator[pa.RecordBatch]":
+        pass
+
+
+class ParquetSink(ArrowSink):
+    codecs = PARQUET_CODECS
+
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        super().__init__(path, options)
+        self.writer: "T.Optional[pq.ParquetWriter]" = None
+
+    def _open(self, schema: "pa.Schema") -> None:
+        import pyarrow.parquet as pq
+
+        self.writer = pq.ParquetWriter(
+            self.path, schema, compression=self.options.compression or "snappy"
+        )
+
+    def _write_table(self, table: "pa.Table") -> None:
+        self.writer.write_table(table, row_group_size=self.options.row_group_size)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+    @classmethod
+    def _read_batches(
+        cls, path: pathlib.Path, chunk_size: int
+    ) -> "T.Iterator[pa.RecordBatch]":
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+
+
+class FeatherSink(ArrowSink):
+    codecs = FEATHER_CODECS
+
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        super().__init__(path, options)
+        self.writer: "T.Optional[pa.ipc.RecordBatchFileWriter]" = None
+
+    def _open(self, schema: "pa.Schema") -> None:
+        import pyarrow as pa
+
+        compression = self.options.compression or "lz4"
+        write_options = pa.ipc.IpcWriteOptions(
+            compression=None if compression == "none" else compression,
+            emit_dictionary_deltas=True,
+        )
+        self.writer = pa.ipc.new_file(str(self.path), schema, options=write_options)
+
+    def _write_table(self, table: "pa.Table") -> None:
+        for batch in table.to_batches(max_chunksize=self.options.row_group_size):
+            self.writer.write_batch(batch)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+    @classmethod
+    def _read_batches(
+        cls, path: pathlib.Path, chunk_size: int
+    ) -> "T.Iterator[pa.RecordBatch]":
+        import pyarrow as pa
+
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+
+
+class FastaSink(DataSink):
+    id_columns = ["protein_id", "protein"]
+    name_column = "full_name"
+    sequence_column = "sequence"
+    refreshable = False
+
+    def __init__(self, path: pathlib.Path, options: SinkOptions = SinkOptions()):
+        from .execution import RowDeduplicator
+
+        super().__init__(path, options)
+        self.writer = open_text_output(path)
+        # Accessions repeat once for every other column selected with the
+        # sequence, only their hashes are kept to write each of them once.
+        self.written = RowDeduplicator()
+
+    @classmethod
+    def validate_columns(cls, columns: T.Sequence[str]) -> None:
+        if cls.sequence_column not in columns or not set(cls.id_columns) & set(columns):
+            raise ValueError("FASTA outputs need the Sequence and ProteinId columns")
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        id_column = next(c for c in self.id_columns if c in chunk.columns)
+        records = chunk.dropna(subset=[self.sequence_column])
+        records = records.drop_duplicates(id_column)
+        records = records.loc[self.written(records[[id_column]]).index]
+        if records.empty:
+            return
+        accessions = records[id_column].astype(str)
+        if id_column == "protein":
+            # Protein IRIs end with the accession.
+            accessions = accessions.str.rsplit("/", n=1).str[-1]
+        headers = ">" + accessions
+        # Compacted chunks hold repeated names and sequences as categoricals.
+        if self.name_column in records.columns:
+            names = records[self.name_column].astype("string")
+            headers += (" " + names).fillna("").astype(object)
+        sequences = records[self.sequence_column].astype("string")
+        lines = sequences.str.findall(f".{{1,{FASTA_LINE_WIDTH}}}")
+        self.writer.write("\n".join(headers + "\n" + lines.str.join("\n")) + "\n")
+
+    def close(self) -> None:
+        self.writer.close()
+
+    @classmethod
+    def read(cls, path: pathlib.Path, chunk_size: int) -> T.Iterator[pd.DataFrame]:
+        opener = gzip.open if path.suffix == ".gz" else open
+        records: T.List[T.Tuple[str, T.Optional[str], str]] = []
+        with opener(path, mode="rt", encoding="utf-8") as reader:
+            header: T.Optional[T.List[str]] = None
+            lines: T.List[str] = []
+            for line in IT.chain(reader, [">"]):
+                line = line.rstrip("\n")
+                if not line.startswith(">"):
+                    lines.append(line)
+                    continue
+                if header is not None:
+                    name = header[1] if len(header) > 1 else None
+                    records.append((header[0], name, "".join(lines)))
+                if len(records) == chunk_size:
+                    yield cls._frame(records)
+                    records = []
+                header, lines = line[1:].split(" ", 1), []
+        if records:
+            yield cls._frame(records)
+
+    @classmethod
+    def _frame(
+        cls, records: T.List[T.Tuple[str, T.Optional[str], str]]
+    ) -> pd.DataFrame:
+        return pd.DataFrame(
+            records,
+            columns=[cls.id_columns[0], cls.name_column, cls.sequence_column],
+            dtype=object,
+        )
+
+
+sink_types: T.Dict[str, T.Type[DataSink]] = {
+    ".csv": CsvSink,
+    ".csv.gz": CsvSink,
+    ".csv.zst": CsvSink,
+    ".tsv": TsvSink,
+    ".tsv.gz": TsvSink,
+    ".tsv.zst": TsvSink,
+    ".xlsx": ExcelSink,
+    ".parquet": ParquetSink,
+    ".feather": FeatherSink,
+    ".arrow": FeatherSink,
+    ".fasta": FastaSink,
+    ".fa": FastaSink,
+    ".fasta.gz": FastaSink,
+    ".fa.gz": FastaSink,
+}
+
+
+def validate_sink_options(path: pathlib.Path, options: SinkOptions) -> None:
+    suffix = sink_suffix(path)
+    sink_type = sink_types[suffix]
+    if options.compression and options.compression.lower() not in sink_type.codecs:
+        raise ValueError(
+            f"Compression {options.compression} is not supported for {suffix} files"
+        )
+
+
+def validate_sink_columns(path: pathlib.Path, columns: T.Sequence[str]) -> None:
+    sink_types[sink_suffix(path)].validate_columns(columns)
+
+
+def validate_sink_refresh(path: pathlib.Path) -> None:
+    suffix = sink_suffix(path)
+    if not sink_types[suffix].refreshable:
+        raise ValueError(f"{suffix} outputs cannot be refreshed")
+
+
+def open_sink(path: pathlib.Path, options: SinkOptions = SinkOptions()) -> DataSink:
+    return sink_types[sink_suffix(path)](path, options)
+
+
+def read_data(
+    path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> T.Iterator[pd.DataFrame]:
+    # Sinks only create arrow files once the first chunk arrives.
+    if not path.exists():
+        return iter([])
+    return sink_types[sink_suffix(path)].read(path, chunk_size)
+
+
+def save_data(
+    data: T.Iterable[pd.DataFrame],
+    path: pathlib.Path,
+    options: SinkOptions = SinkOptions(),
+) -> None:
+    # Rows are written next to the output and moved over it once complete, a
+    # failed run leaves the previous output in place rather than a part of it.
+    temporary_path = partial_path(path)
+    try:
+        with open_sink(temporary_path, options) as sink:
+            for chunk in data:
+                with profiling.span("writing"):
+                    sink.write(chunk)
+    except BaseException:
+        temporary_path.unlink(missing_ok=True)
+        raise
+    os.replace(temporary_path, path)
@@ -1,12 +1,26 @@
 import typing as T
-import itertools as IT
 import abc
+import io
 import os
-import functools as FT
+import copy
+
+INDENT = " " * 4
+VALUES_PER_WRITE = 4096
+# ASCII record and unit separators, they do not occur in the values of the
+# repositories, unlike the separator of the lists.
+ROW_SEPARATOR = "\x1e"
+FIELD_SEPARATOR = "\x1f"
+
+
+def string_literal(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"')
+    # Control characters are escaped so that printed queries stay readable.
+    escaped = "".join(c if c.isprintable() else f"\\u{ord(c):04X}" for c in escaped)
+    return f'"{escaped}"'
 
 
 class Variable:
-    name: str
+    __slots__ = ("name",)
 
     def __init__(self, name: str):
         self.name = name
@@ -18,207 +32,481 @@ class Variable:
         return f"?{self.name}"
 
 
+class Projection(Variable):
+    __slots__ = ("expression",)
+
+    def __init__(self, name: str, expression: str):
+        super().__init__(name)
+        self.expression = expression
+
+    def get_pretty_text(self) -> str:
+        return f"({self.expression} AS ?{self.name})"
+
+
+class GroupConcat(Projection):
+    __slots__ = ("variable", "separator")
+
+    def __init__(self, name: str, variable: Variable, separator: str):
+        super().__init__(
+            name,
+            f"GROUP_CONCAT({variable}; SEPARATOR={string_literal(separator)})",
+        )
+        self.variable = variable
+        self.separator = separator
+
+
+class RowConcat(GroupConcat):
+    # GROUP_CONCAT does not keep any order, lists of separate columns could
+    # not be matched by position. The values of every row are packed into one
+    # item and unpacked into lists of the columns on the client.
+    __slots__ = ("fields", "columns", "list_separator")
+
+    def __init__(
+        self,
+        name: str,
+        variable: Variable,
+        fields: T.Sequence[str],
+        columns: T.Sequence[str],
+        list_separator: str,
+    ):
+        super().__init__(name, variable, ROW_SEPARATOR)
+        self.fields = fields
+        self.columns = columns
+        self.list_separator = list_separator
+
+
 TripletMemeber = Variable | str
 
 
-class Triplet:
-    def __init__(self, subj: TripletMemeber, pred: TripletMemeber, obj: TripletMemeber):
-        self.triplet = [subj, pred, obj]
+class LineWriter:
+    __slots__ = ("stream", "separator", "first")
+
+    def __init__(self, stream: T.TextIO, separator: str = os.linesep):
+        self.stream = stream
+        self.separator = separator
+        self.first = True
+
+    def line(self, text: str) -> None:
+        if self.first:
+            self.first = False
+        else:
+            self.stream.write(self.separator)
+        self.stream.write(text)
+
+    def lines(self, texts: T.Sequence[str]) -> None:
+        for start in range(0, len(texts), VALUES_PER_WRITE):
+            batch = texts[start : start + VALUES_PER_WRITE]
+            self.line(self.separator.join(batch))
+
+
+# Work items of the renderer: either a finished line or a node to expand
+# together with its indentation and the text leading its first line.
+RenderItem = T.Union[str, T.Tuple["Node", str, str]]
+
+
+class Node:
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        pass
 
     def __str__(self) -> str:
         return self.get_pretty_text()
 
+    def write(self, stream: T.TextIO, separator: str = os.linesep) -> None:
+        render(self, LineWriter(stream, separator))
+
     def get_pretty_text(self) -> str:
-        return " ".join(map(str, self.triplet)) + " ."
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
 
     def get_lines(self) -> T.Iterable[str]:
-        return [self.get_pretty_text()]
+        return self.get_pretty_text().split(os.linesep)
 
 
-class GraphPattern:
-    @abc.abstractmethod
+def render(node: Node, writer: LineWriter) -> None:
+    # Nested patterns are expanded on an explicit stack instead of recursion,
+    # so neither deep nesting nor wide unions are limited by the call stack.
+    stack: T.List[RenderItem] = [(node, "", "")]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            writer.line(item)
+        else:
+            current, indent, lead = item
+            current._render(indent, lead, writer, stack)
+
+
+class Triplet(Node):
+    __slots__ = ("triplet",)
+
+    def __init__(self, subj: TripletMemeber, pred: TripletMemeber, obj: TripletMemeber):
+        self.triplet = (subj, pred, obj)
+
     def get_pretty_text(self) -> str:
-        pass
+        return " ".join(map(str, self.triplet)) + " ."
 
-    @abc.abstractmethod
-    def get_lines(self) -> T.Iterable[str]:
-        pass
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(indent + lead + self.get_pretty_text())
+
+
+class GraphPattern(Node):
+    __slots__ = ()
 
 
 class SimpleGraphPattern(GraphPattern):
+    __slots__ = ("patterns",)
+
     def __init__(self, patterns: T.Sequence[GraphPattern | Triplet]):
         self.patterns = patterns
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
-    def get_pretty_text(self) -> str:
-        return os.linesep.join(self.get_lines())
-
-    def get_lines(self) -> T.Iterable[str]:
-        lines = map(
-            lambda l: " " * 4 + l,
-            IT.chain.from_iterable(map(lambda p: p.get_lines(), self.patterns)),
-        )
-        yield "{"
-        for l in lines:
-            yield l
-        yield "}"
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(indent + lead + "{")
+        stack.append(indent + "}")
+        nested_indent = indent + INDENT
+        stack.extend((p, nested_indent, "") for p in reversed(self.patterns))
 
 
 class Union(GraphPattern):
+    __slots__ = ("patterns",)
+
     def __init__(self, patterns: T.Sequence[GraphPattern | Triplet]):
         self.patterns = patterns
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
-    def get_pretty_text(self) -> str:
-        return os.linesep.join(self.get_lines())
-
-    def get_lines(self) -> T.Iterable[str]:
-        return FT.reduce(
-            lambda l, pattern: IT.chain(
-                l, ["UNION"], [line for line in pattern.get_lines()]
-            ),
-            self.patterns[1:],
-            self.patterns[0].get_lines(),
-        )
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        separator = indent + "UNION"
+        for pattern in reversed(self.patterns[1:]):
+            stack.append((pattern, indent, ""))
+            stack.append(separator)
+        stack.append((self.patterns[0], indent, lead))
 
 
 class OptionalGraphPattern(GraphPattern):
+    __slots__ = ("graph_pattern",)
+
     def __init__(self, graph_pattern: GraphPattern):
         self.graph_pattern = graph_pattern
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
-    def get_pretty_text(self) -> str:
-        return os.linesep.join(self.get_lines())
-
-    def get_lines(self) -> T.Iterable[str]:
-        lines = list(self.graph_pattern.get_lines())
-        yield f"OPTIONAL {lines[0]}"
-        for l in lines[1:]:
-            yield l
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        stack.append((self.graph_pattern, indent, lead + "OPTIONAL "))
 
 
 class InlineData(GraphPattern):
+    __slots__ = ("values", "variable")
+
     def __init__(self, variable: Variable, values: T.Sequence[str]):
         self.values = values
         self.variable = variable
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
-    def get_pretty_text(self) -> str:
-        return os.linesep.join(self.get_lines())
-
-    def get_lines(self) -> T.Iterable[str]:
-        yield "VALUES {} {{".format(self.variable.get_pretty_text())
-        for v in self.values:
-            yield 4 * " " + v
-        yield "}"
+    def split(self, size: int) -> T.List["InlineData"]:
+        return [
+            InlineData(self.variable, self.values[start : start + size])
+            for start in range(0, len(self.values), size)
+        ]
+
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(
+            "{}{}VALUES {} {{".format(indent, lead, self.variable.get_pretty_text())
+        )
+        value_indent = indent + INDENT
+        writer.lines([value_indent + v for v in self.values])
+        writer.line(indent + "}")
 
 
 class ServiceGraphPattern(GraphPattern):
+    __slots__ = ("service", "graph_pattern")
+
     def __init__(self, service: str, pattern: GraphPattern):
         self.service = service
         self.graph_pattern = pattern
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
-    def get_pretty_text(self) -> str:
-        return os.linesep.join(self.get_lines())
-
-    def get_lines(self) -> T.Iterable[str]:
-        lines = list(self.graph_pattern.get_lines())
-        yield f"SERVICE <{self.service}> {lines[0]}"
-        for l in lines[1:]:
-            yield l
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        stack.append((self.graph_pattern, indent, f"{lead}SERVICE <{self.service}> "))
 
 
 class BindExpression(GraphPattern):
+    __slots__ = ("out_var", "in_vars", "expression")
+
     def __init__(self, out_var: Variable, in_vars: T.Sequence[Variable], expr: str):
         self.out_var = out_var
         self.in_vars = in_vars
         self.expression = expr
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
     def get_pretty_text(self) -> str:
         substituted_expression = str.format(
             self.expression, *list(map(str, self.in_vars))
         )
         return str.format(f"BIND(({substituted_expression}) AS {str(self.out_var)})")
 
-    def get_lines(self) -> T.Iterable[str]:
-        return [self.get_pretty_text()]
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(indent + lead + self.get_pretty_text())
 
 
 class FilterExpression(GraphPattern):
+    __slots__ = ("in_vars", "expression")
+
     def __init__(self, in_vars: T.Sequence[Variable], expr: str):
         self.in_vars = in_vars
         self.expression = expr
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
     def get_pretty_text(self) -> str:
         substituted_expression = str.format(
             self.expression, *list(map(str, self.in_vars))
         )
         return str.format(f"FILTER( {substituted_expression} )")
 
-    def get_lines(self) -> T.Iterable[str]:
-        return [self.get_pretty_text()]
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(indent + lead + self.get_pretty_text())
+
+
+class SubSelect(GraphPattern):
+    __slots__ = ("query",)
+
+    def __init__(self, query: "SelectQuery"):
+        self.query = query
+
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(indent + lead + "{")
+        stack.append(indent + "}")
+        stack.append((self.query, indent + INDENT, ""))
+
+
+Pattern = GraphPattern | Triplet
+
+
+def iter_patterns(pattern: Pattern) -> T.Iterator[Pattern]:
+    stack = [pattern]
+    while stack:
+        current = stack.pop()
+        yield current
+        if isinstance(current, (SimpleGraphPattern, Union)):
+            stack.extend(reversed(current.patterns))
+        if isinstance(current, (OptionalGraphPattern, ServiceGraphPattern)):
+            stack.append(current.graph_pattern)
+        if isinstance(current, SubSelect):
+            stack.append(current.query.graph_pattern)
+
+
+def iter_variables(pattern: Pattern) -> T.Iterator[Variable]:
+    for current in iter_patterns(pattern):
+        if isinstance(current, Triplet):
+            yield from (m for m in current.triplet if isinstance(m, Variable))
+        elif isinstance(current, InlineData):
+            yield current.variable
+        elif isinstance(current, BindExpression):
+            yield from current.in_vars
+            yield current.out_var
+        elif isinstance(current, FilterExpression):
+            yield from current.in_vars
+
+
+def replace_patterns(
+    pattern: Pattern, replacements: T.Mapping[Pattern, Pattern]
+) -> Pattern:
+    if pattern in replacements:
+        return replacements[pattern]
+    if isinstance(pattern, SimpleGraphPattern):
+        return SimpleGraphPattern(
+            [replace_patterns(p, replacements) for p in pattern.patterns]
+        )
+    if isinstance(pattern, Union):
+        return Union([replace_patterns(p, replacements) for p in pattern.patterns])
+    if isinstance(pattern, OptionalGraphPattern):
+        return OptionalGraphPattern(
+            replace_patterns(pattern.graph_pattern, replacements)
+        )
+    if isinstance(pattern, ServiceGraphPattern):
+        return ServiceGraphPattern(
+            pattern.service, replace_patterns(pattern.graph_pattern, replacements)
+        )
+    if isinstance(pattern, SubSelect):
+        return SubSelect(
+            pattern.query.with_graph_pattern(
+                replace_patterns(pattern.query.graph_pattern, replacements)
+            )
+        )
+    return pattern
+
+
+def redirect_services(
+    query: "SelectQuery", services: T.Mapping[str, str]
+) -> "SelectQuery":
+    replacements: T.Dict[Pattern, Pattern] = {
+        pattern: ServiceGraphPattern(services[pattern.service], pattern.graph_pattern)
+        for pattern in iter_patterns(query.graph_pattern)
+        if isinstance(pattern, ServiceGraphPattern) and pattern.service in services
+    }
+    if not replacements:
+        return query
+    return query.with_graph_pattern(replace_patterns(query.graph_pattern, replacements))
+
 
+def inline_services(query: "SelectQuery") -> "SelectQuery":
+    replacements: T.Dict[Pattern, Pattern] = {
+        pattern: pattern.graph_pattern
+        for pattern in iter_patterns(query.graph_pattern)
+        if isinstance(pattern, ServiceGraphPattern)
+    }
+    if not replacements:
+        return query
+    return query.with_graph_pattern(replace_patterns(query.graph_pattern, replacements))
+
+
+class Prefix(Node):
+    __slots__ = ("prefix", "iri_ref")
 
-class Prefix:
     def __init__(self, prefix: str, iri_ref: str):
         self.prefix = prefix
         self.iri_ref = iri_ref
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
     def get_pretty_text(self) -> str:
         return f"PREFIX {self.prefix}: {self.iri_ref}"
 
-    def get_lines(self) -> T.Iterable[str]:
-        return [self.get_pretty_text()]
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        writer.line(indent + lead + self.get_pretty_text())
+
 
+class SelectQuery(Node):
+    __slots__ = (
+        "prefixes",
+        "variables",
+        "graph_pattern",
+        "distinct",
+        "order_by",
+        "limit",
+        "offset",
+        "group_by",
+    )
 
-class SelectQuery:
     def __init__(
         self,
         prefixes: T.Sequence[Prefix],
         variables: T.Sequence[Variable],
         graph_pattern: GraphPattern,
         distinct: bool = True,
+        order_by: T.Sequence[Variable] = (),
+        limit: T.Optional[int] = None,
+        offset: T.Optional[int] = None,
+        group_by: T.Sequence[Variable] = (),
     ):
         self.prefixes = prefixes
         self.variables = variables
         self.graph_pattern = graph_pattern
         self.distinct = distinct
+        self.order_by = order_by
+        self.limit = limit
+        self.offset = offset
+        self.group_by = group_by
+
+    def with_graph_pattern(self, graph_pattern: GraphPattern) -> "SelectQuery":
+        query = copy.copy(self)
+        query.graph_pattern = graph_pattern
+        return query
+
+    def page(self, number: int, size: int) -> "SelectQuery":
+        query = copy.copy(self)
+        # Keys of a grouped query identify its rows, aggregates can not be
+        # ordered by.
+        query.order_by = (
+            self.order_by or self.group_by or [Variable(v.name) for v in self.variables]
+        )
+        query.limit = size
+        query.offset = number * size
+        return query
+
+    def count(self, name: str = "n") -> "SelectQuery":
+        # Distinct rows can only be counted by wrapping the query in a
+        # subselect, COUNT(DISTINCT *) would count all variables of the pattern.
+        graph_pattern = self.graph_pattern
+        if self.distinct or self.group_by:
+            inner = SelectQuery(
+                (),
+                self.variables,
+                self.graph_pattern,
+                self.distinct,
+                group_by=self.group_by,
+            )
+            graph_pattern = SimpleGraphPattern([SubSelect(inner)])
+        return SelectQuery(
+            self.prefixes, [Projection(name, "COUNT(*)")], graph_pattern, False
+        )
 
-    def __str__(self) -> str:
-        return self.get_pretty_text()
-
-    def get_pretty_text(self) -> str:
-        return os.linesep.join(self.get_lines())
+    def aggregate(self, keys: T.Sequence[Variable], separator: str) -> "SelectQuery":
+        # The values of a row are packed in a subselect, an alias can not reuse
+        # a variable of the pattern. CONCAT only joins strings, IRIs are
+        # converted as in CSV results and unbound values become empty ones.
+        # Lists always hold distinct rows, duplicates would be expanded again.
+        key_names = {key.name for key in keys}
+        fields = [v.name for v in self.variables if v.name not in key_names]
+        packed = f", {string_literal(FIELD_SEPARATOR)}, ".join(
+            f'COALESCE(STR(?{name}), "")' for name in fields
+        )
+        inner = SelectQuery(
+            (),
+            [*keys, Projection("rows_item", f"CONCAT({packed})")],
+            self.graph_pattern,
+        )
+        return SelectQuery(
+            self.prefixes,
+            [
+                *(Variable(key.name) for key in keys),
+                RowConcat(
+                    "rows",
+                    Variable("rows_item"),
+                    fields,
+                    [v.name for v in self.variables],
+                    separator,
+                ),
+            ],
+            SimpleGraphPattern([SubSelect(inner)]),
+            self.distinct,
+            group_by=[Variable(key.name) for key in keys],
+        )
 
-    def get_lines(self) -> T.Iterable[str]:
-        prefixes = map(lambda p: p.get_pretty_text(), self.prefixes)
+    def _render(
+        self, indent: str, lead: str, writer: LineWriter, stack: T.List[RenderItem]
+    ) -> None:
+        for prefix in self.prefixes:
+            writer.line(indent + prefix.get_pretty_text())
         select = "SELECT DISTINCT" if self.distinct else "SELECT"
         variables_str = " ".join(map(lambda v: v.get_pretty_text(), self.variables))
-        variables = f"{select} {variables_str}"
-        graph_pattern_lines = list(self.graph_pattern.get_lines())
-        for prefix in prefixes:
-            yield prefix
-        yield variables
-        yield f"WHERE {graph_pattern_lines[0]}"
-        for graph_pattern_line in graph_pattern_lines[1:]:
-            yield graph_pattern_line
+        writer.line(f"{indent}{lead}{select} {variables_str}")
+        if self.offset is not None:
+            stack.append(f"{indent}OFFSET {self.offset}")
+        if self.limit is not None:
+            stack.append(f"{indent}LIMIT {self.limit}")
+        if self.order_by:
+            stack.append(
+                f"{indent}ORDER BY "
+                + " ".join(map(lambda v: v.get_pretty_text(), self.order_by))
+            )
+        if self.group_by:
+            stack.append(
+                f"{indent}GROUP BY "
+                + " ".join(map(lambda v: v.get_pretty_text(), self.group_by))
+            )
+        stack.append((self.graph_pattern, indent, "WHERE "))
@@ -0,0 +1,96 @@
+import email.utils
+import random
+import time
+import typing as T
+import urllib.parse
+from dataclasses import dataclass, field
+import requests
+from requests.adapters import HTTPAdapter
+from .defaults import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_POST_THRESHOLD,
+    DEFAULT_RETRIES,
+)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = DEFAULT_RETRIES
+    backoff: float = 1.0
+    max_backoff: float = 60.0
+
+    def delay(self, attempt: int, retry_after: T.Optional[str] = None) -> float:
+        if retry_after:
+            requested = parse_retry_after(retry_after)
+            if requested is not None:
+                return min(requested, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+def parse_retry_after(value: str) -> T.Optional[float]:
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def query_parameters(query_text: str) -> T.Dict[str, str]:
+    return {"query": query_text, "format": "csv"}
+
+
+def use_post(parameters: T.Dict[str, str], post_threshold: int) -> bool:
+    return len(urllib.parse.urlencode(parameters)) > post_threshold
+
+
+@dataclass
+class SparqlClient:
+    pool_size: int = DEFAULT_POOL_SIZE
+    post_threshold: int = DEFAULT_POST_THRESHOLD
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    session: requests.Session = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {"Accept": "text/csv", "Accept-Encoding": "gzip, deflate"}
+        )
+
+    def _send(self, url: str, parameters: T.Dict[str, str]) -> requests.Response:
+        timeout = (DEFAULT_CONNECT_TIMEOUT, None)
+        if use_post(parameters, self.post_threshold):
+            return self.session.post(url, data=parameters, stream=True, timeout=timeout)
+        return self.session.get(url, params=parameters, stream=True, timeout=timeout)
+
+    def request(self, url: str, query_text: str) -> requests.Response:
+        parameters = query_parameters(query_text)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._send(url, parameters)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retry.attempts:
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.retry.attempts:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                time.sleep(self.retry.delay(attempt, retry_after))
+                continue
+            if not response.ok:
+                response.close()
+                response.raise_for_status()
+            return response
+
+    def close(self) -> None:
+        self.session.close()
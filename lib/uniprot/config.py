@@ -3,7 +3,7 @@ import typing as T
 import dataclasses_json as DJ
 from enum import Enum
 
-URL = "https://sparql.uniprot.org"
+URL = "https://sparql.uniprot.org/sparql"
 
 
 class Feature(Enum):
@@ -12,6 +12,10 @@ class Feature(Enum):
     NAME = "Name"
     SEQUENCE = "Sequence"
     REACTION = "Reaction"
+    REACTION_PARTICIPANT = "ReactionParticipant"
+    CHEBI = "Chebi"
+    SMILES = "Smiles"
+    REACTION_SIDE = "ReactionSide"
 
 
 @DJ.dataclass_json(letter_case=DJ.LetterCase.CAMEL)
@@ -21,6 +25,7 @@ class UniprotSearchFilter(DJ.DataClassJsonMixin):
     supfams: T.Optional[T.List[str]] = None
     reviewed: T.Optional[bool] = None
     taxa: T.Optional[T.List[str]] = None
+    modified_since: T.Optional[str] = None
 
 
 @DJ.dataclass_json(letter_case=DJ.LetterCase.CAMEL)
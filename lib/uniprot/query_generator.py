@@ -14,14 +14,32 @@ class UniprotQueryBuilder(SparqlQueryBuilder[C.UniprotSearchConfig]):
         C.Feature.PROTEIN_ID: UniprotEntity.PROTEIN_ID,
         C.Feature.SEQUENCE: UniprotEntity.SEQUENCE,
         C.Feature.REACTION: RheaEntity.REACTION,
+        C.Feature.REACTION_PARTICIPANT: RheaEntity.COMPOUND,
+        C.Feature.REACTION_SIDE: RheaEntity.REACTION_SIDE_ORDER,
+        C.Feature.CHEBI: RheaEntity.CHEBI,
+        C.Feature.SMILES: RheaEntity.SMILES,
     }
 
     entity_type = UniprotEntity
     root_entity = UniprotEntity.START
     repository = Repository.UNIPROT
+    grouping_entities = frozenset(
+        [
+            UniprotEntity.PROTEIN,
+            UniprotEntity.PROTEIN_ID,
+            UniprotEntity.FULL_NAME,
+            UniprotEntity.SEQUENCE,
+        ]
+    )
 
-    def __init__(self, config: C.UniprotSearchConfig) -> None:
-        super().__init__(config, True)
+    def __init__(
+        self,
+        config: C.UniprotSearchConfig,
+        distinct: bool = True,
+        optimize: bool = True,
+        aggregate: bool = False,
+    ) -> None:
+        super().__init__(config, distinct, optimize, aggregate)
 
     def _get_entities(self) -> T.List[SparqlEntity]:
         features = self.config.data_selector.columns
@@ -32,17 +50,20 @@ class UniprotQueryBuilder(SparqlQueryBuilder[C.UniprotSearchConfig]):
         filters: T.List[Recipe] = []
 
         if self.config.data_filter.pfams:
-            filters.append(
-                UniprotFilters.pfam_filter(self.config.data_filter.pfams))
+            filters.append(UniprotFilters.pfam_filter(self.config.data_filter.pfams))
         if self.config.data_filter.reviewed:
             filters.append(
-                UniprotFilters.reviewed_filter(
-                    self.config.data_filter.reviewed))
+                UniprotFilters.reviewed_filter(self.config.data_filter.reviewed)
+            )
         if self.config.data_filter.taxa:
-            filters.append(
-                UniprotFilters.taxa_filter(self.config.data_filter.taxa))
+            filters.append(UniprotFilters.taxa_filter(self.config.data_filter.taxa))
         if self.config.data_filter.supfams:
             filters.append(
-                UniprotFilters.supfam_filter(self.config.data_filter.supfams))
+                UniprotFilters.supfam_filter(self.config.data_filter.supfams)
+            )
+        if self.config.data_filter.modified_since:
+            filters.append(
+                UniprotFilters.modified_filter(self.config.data_filter.modified_since)
+            )
 
         return filters
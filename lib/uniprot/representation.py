@@ -1,9 +1,22 @@
 from .entities import UniprotEntity
 from ..rhea.entities import RheaEntity
 from networkx import MultiDiGraph
-from ..common import Recipe, Repository, create_triplet_recipe, SparqlEntity
+from ..common import (
+    Recipe,
+    Repository,
+    create_triplet_recipe,
+    SparqlEntity,
+    VALUE_SELECTIVITY,
+)
 import lib.sparql_query as SQ
 import typing as T
+import datetime
+
+# Rough shares of UniProtKB, about half a million of its entries are reviewed
+# and every taxon of a filter is expected to cover a tenth of it.
+REVIEWED_SELECTIVITY = 2e-3
+TAXON_SELECTIVITY = 0.1
+MODIFIED_SELECTIVITY = 0.1
 
 
 def create_uniprot_triplet_recipe(
@@ -22,138 +35,147 @@ def create_uniprot_triplet_edege(
     )
 
 
-knowledge_graph = MultiDiGraph()
-knowledge_graph.add_nodes_from(UniprotEntity)
-knowledge_graph.add_node(RheaEntity.REACTION)
-knowledge_graph.add_edges_from(
-    [
-        (
-            UniprotEntity.START,
-            UniprotEntity.PROTEIN,
-            {
-                "recipe": Recipe(
-                    Repository.UNIPROT,
-                    [UniprotEntity.PROTEIN],
-                    lambda d: SQ.Triplet(d[UniprotEntity.PROTEIN], "a", "up:Protein"),
-                )
-            },
-        ),
-        (
-            UniprotEntity.PROTEIN,
-            UniprotEntity.PROTEIN_ID,
-            {
-                "recipe": Recipe(
-                    Repository.UNIPROT,
-                    [UniprotEntity.PROTEIN, UniprotEntity.PROTEIN_ID],
-                    lambda d: SQ.BindExpression(
-                        d[UniprotEntity.PROTEIN_ID],
-                        [d[UniprotEntity.PROTEIN]],
-                        "substr(str({}), 33)",
-                    ),
-                )
-            },
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.PROTEIN, UniprotEntity.ORGANISM, "up:organism"
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.ORGANISM,
-            UniprotEntity.TAXON_FILTERING,
-            "^skos:narrowerTransitive+",
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.PROTEIN,
-            UniprotEntity.CATALYTIC_ACTIVITY,
-            "up:annotation/up:catalyticActivity",
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.CATALYTIC_ACTIVITY,
-            RheaEntity.REACTION,
-            "up:catalyzedReaction",
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.PROTEIN, UniprotEntity.RECOMMENDED_NAME, "up:recommendedName"
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.RECOMMENDED_NAME, UniprotEntity.FULL_NAME, "up:fullName"
-        ),
-        (
-            UniprotEntity.PROTEIN,
-            UniprotEntity.SEQUENCE_OBJECT,
-            {
-                "recipe": Recipe(
-                    Repository.UNIPROT,
-                    [UniprotEntity.PROTEIN, UniprotEntity.SEQUENCE_OBJECT],
-                    lambda d: SQ.SimpleGraphPattern(
-                        [
-                            SQ.Triplet(
-                                d[UniprotEntity.PROTEIN],
-                                "up:sequence",
-                                d[UniprotEntity.SEQUENCE_OBJECT],
-                            ),
-                            SQ.Triplet(
-                                d[UniprotEntity.SEQUENCE_OBJECT],
-                                "a",
-                                "up:Simple_Sequence",
-                            ),
-                        ]
-                    ),
-                )
-            },
-        ),
-        create_uniprot_triplet_edege(
-            UniprotEntity.SEQUENCE_OBJECT, UniprotEntity.SEQUENCE, "rdf:value"
-        ),
-        (
-            UniprotEntity.PROTEIN,
-            UniprotEntity.PFAM,
-            {
-                "recipe": Recipe(
-                    Repository.UNIPROT,
-                    [UniprotEntity.PROTEIN, UniprotEntity.PFAM],
-                    lambda d: SQ.SimpleGraphPattern(
-                        [
-                            SQ.Triplet(
-                                d[UniprotEntity.PROTEIN],
-                                "rdfs:seeAlso",
-                                d[UniprotEntity.PFAM],
-                            ),
-                            SQ.Triplet(
-                                d[UniprotEntity.PFAM],
-                                "up:database",
-                                "<http://purl.uniprot.org/database/Pfam>",
-                            ),
-                        ]
-                    ),
-                )
-            },
-        ),
-        (
-            UniprotEntity.PROTEIN,
-            UniprotEntity.SUPFAM,
-            {
-                "recipe": Recipe(
-                    Repository.UNIPROT,
-                    [UniprotEntity.PROTEIN, UniprotEntity.SUPFAM],
-                    lambda d: SQ.SimpleGraphPattern(
-                        [
-                            SQ.Triplet(
-                                d[UniprotEntity.PROTEIN],
-                                "rdfs:seeAlso",
-                                d[UniprotEntity.SUPFAM],
-                            ),
-                            SQ.Triplet(
-                                d[UniprotEntity.SUPFAM],
-                                "up:database",
-                                "<http://purl.uniprot.org/database/SUPFAM>",
-                            ),
-                        ]
-                    ),
-                )
-            },
-        ),
-    ]
-)
+def build_knowledge_graph() -> MultiDiGraph:
+    knowledge_graph = MultiDiGraph()
+    knowledge_graph.add_nodes_from(UniprotEntity)
+    knowledge_graph.add_node(RheaEntity.REACTION)
+    knowledge_graph.add_edges_from(
+        [
+            (
+                UniprotEntity.START,
+                UniprotEntity.PROTEIN,
+                {
+                    "recipe": Recipe(
+                        Repository.UNIPROT,
+                        [UniprotEntity.PROTEIN],
+                        lambda d: SQ.Triplet(
+                            d[UniprotEntity.PROTEIN], "a", "up:Protein"
+                        ),
+                    )
+                },
+            ),
+            (
+                UniprotEntity.PROTEIN,
+                UniprotEntity.PROTEIN_ID,
+                {
+                    "recipe": Recipe(
+                        Repository.UNIPROT,
+                        [UniprotEntity.PROTEIN, UniprotEntity.PROTEIN_ID],
+                        lambda d: SQ.BindExpression(
+                            d[UniprotEntity.PROTEIN_ID],
+                            [d[UniprotEntity.PROTEIN]],
+                            "substr(str({}), 33)",
+                        ),
+                    )
+                },
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.PROTEIN, UniprotEntity.ORGANISM, "up:organism"
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.PROTEIN, UniprotEntity.MODIFIED, "up:modified"
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.ORGANISM,
+                UniprotEntity.TAXON_FILTERING,
+                "^skos:narrowerTransitive+",
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.PROTEIN,
+                UniprotEntity.CATALYTIC_ACTIVITY,
+                "up:annotation/up:catalyticActivity",
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.CATALYTIC_ACTIVITY,
+                RheaEntity.REACTION,
+                "up:catalyzedReaction",
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.PROTEIN,
+                UniprotEntity.RECOMMENDED_NAME,
+                "up:recommendedName",
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.RECOMMENDED_NAME, UniprotEntity.FULL_NAME, "up:fullName"
+            ),
+            (
+                UniprotEntity.PROTEIN,
+                UniprotEntity.SEQUENCE_OBJECT,
+                {
+                    "recipe": Recipe(
+                        Repository.UNIPROT,
+                        [UniprotEntity.PROTEIN, UniprotEntity.SEQUENCE_OBJECT],
+                        lambda d: SQ.SimpleGraphPattern(
+                            [
+                                SQ.Triplet(
+                                    d[UniprotEntity.PROTEIN],
+                                    "up:sequence",
+                                    d[UniprotEntity.SEQUENCE_OBJECT],
+                                ),
+                                SQ.Triplet(
+                                    d[UniprotEntity.SEQUENCE_OBJECT],
+                                    "a",
+                                    "up:Simple_Sequence",
+                                ),
+                            ]
+                        ),
+                    )
+                },
+            ),
+            create_uniprot_triplet_edege(
+                UniprotEntity.SEQUENCE_OBJECT, UniprotEntity.SEQUENCE, "rdf:value"
+            ),
+            (
+                UniprotEntity.PROTEIN,
+                UniprotEntity.PFAM,
+                {
+                    "recipe": Recipe(
+                        Repository.UNIPROT,
+                        [UniprotEntity.PROTEIN, UniprotEntity.PFAM],
+                        lambda d: SQ.SimpleGraphPattern(
+                            [
+                                SQ.Triplet(
+                                    d[UniprotEntity.PROTEIN],
+                                    "rdfs:seeAlso",
+                                    d[UniprotEntity.PFAM],
+                                ),
+                                SQ.Triplet(
+                                    d[UniprotEntity.PFAM],
+                                    "up:database",
+                                    "<http://purl.uniprot.org/database/Pfam>",
+                                ),
+                            ]
+                        ),
+                    )
+                },
+            ),
+            (
+                UniprotEntity.PROTEIN,
+                UniprotEntity.SUPFAM,
+                {
+                    "recipe": Recipe(
+                        Repository.UNIPROT,
+                        [UniprotEntity.PROTEIN, UniprotEntity.SUPFAM],
+                        lambda d: SQ.SimpleGraphPattern(
+                            [
+                                SQ.Triplet(
+                                    d[UniprotEntity.PROTEIN],
+                                    "rdfs:seeAlso",
+                                    d[UniprotEntity.SUPFAM],
+                                ),
+                                SQ.Triplet(
+                                    d[UniprotEntity.SUPFAM],
+                                    "up:database",
+                                    "<http://purl.uniprot.org/database/SUPFAM>",
+                                ),
+                            ]
+                        ),
+                    )
+                },
+            ),
+        ]
+    )
+    return knowledge_graph
 
 
 class UniprotFilters:
@@ -171,6 +193,7 @@ class UniprotFilters:
                     )
                 ),
             ),
+            min(len(taxa) * TAXON_SELECTIVITY, 1.0),
         )
 
     @classmethod
@@ -187,6 +210,7 @@ class UniprotFilters:
                     )
                 ),
             ),
+            min(len(pfams) * VALUE_SELECTIVITY, 1.0),
         )
 
     @classmethod
@@ -203,6 +227,7 @@ class UniprotFilters:
                     )
                 ),
             ),
+            min(len(supfams) * VALUE_SELECTIVITY, 1.0),
         )
 
     @classmethod
@@ -213,4 +238,18 @@ class UniprotFilters:
             lambda d: SQ.Triplet(
                 d[UniprotEntity.PROTEIN], "up:reviewed", "true" if reviewed else "false"
             ),
+            REVIEWED_SELECTIVITY if reviewed else 1 - REVIEWED_SELECTIVITY,
+        )
+
+    @classmethod
+    def modified_filter(cls, since: str) -> Recipe:
+        since = datetime.date.fromisoformat(since).isoformat()
+        return Recipe(
+            Repository.UNIPROT,
+            [UniprotEntity.MODIFIED],
+            lambda d: SQ.FilterExpression(
+                [d[UniprotEntity.MODIFIED]],
+                f'{{}} >= "{since}"^^<http://www.w3.org/2001/XMLSchema#date>',
+            ),
+            MODIFIED_SELECTIVITY,
         )